@@ -0,0 +1,59 @@
+import dataclasses
+import gc
+import tracemalloc
+from src.lexer.lexer import Lexer
+from src.parser.parser import Parser
+from src.parser.arena import NodeArena
+from src.parser import ast_nodes
+from src.compiler.compiler import Compiler
+from benchmarks.programs import generated_program
+
+NODE_TYPES = [ast_nodes.While, ast_nodes.Number, ast_nodes.Var, ast_nodes.BinOp, ast_nodes.UnOp,
+              ast_nodes.Assign, ast_nodes.Print, ast_nodes.If, ast_nodes.CompoundAssign]
+
+# The same node classes without __slots__, i.e. what every node used to be
+DICT_TYPES = {cls: dataclasses.make_dataclass(cls.__name__, [f.name for f in dataclasses.fields(cls)])
+              for cls in NODE_TYPES}
+
+def to_dict_nodes(node):
+    if isinstance(node, list):
+        return [to_dict_nodes(n) for n in node]
+    if isinstance(node, ast_nodes.ASTNode):
+        values = [to_dict_nodes(getattr(node, f.name)) for f in dataclasses.fields(node)]
+        return DICT_TYPES[type(node)](*values)
+    return node
+
+def count_nodes(nodes):
+    arena = NodeArena(nodes)
+    return len(arena)
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def bench():
+    source = generated_program(5000)
+    tokens = Lexer().lex_packed(source)
+    nodes = Parser(tokens).parse()
+    count = count_nodes(nodes)
+    print(f'input: {len(source)} chars, {count} nodes')
+
+    rows = [
+        ('dataclass + __dict__', lambda: to_dict_nodes(nodes)),
+        ('__slots__ nodes', lambda: Parser(tokens).parse()),
+        ('NodeArena', lambda: Parser(tokens).parse_arena()),
+    ]
+    for name, build in rows:
+        result, size = measure(build)
+        print(f'{name:<22} {size / count:8.1f} bytes/node')
+        del result
+
+    arena = Parser(tokens).parse_arena()
+    assert Compiler().compile_program(arena) == Compiler().compile_program(nodes)
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,51 @@
+import time
+from src.compiler.passes import PassManager
+from src.utils.helpers import compile_ast, parse_source
+from src.vm.closures import ClosureProgram
+from src.vm.transpile import PythonProgram
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.programs import counting_loop, nested_loops
+
+SAMPLES = {
+    'counting loop': counting_loop(100000),
+    'nested loops': nested_loops(300),
+    'guarded loop': '''
+i = 0;
+hits = 0;
+while (i < 100000) {
+    if (i != 0 && 1000 / i > 3 || i / 7 * 7 == i) {
+        hits += 1;
+    }
+    i += 1;
+}
+print hits;
+''',
+}
+
+def best_of(make, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        runner = make()
+        start = time.perf_counter()
+        runner.run()
+        best = min(best, time.perf_counter() - start)
+    return best, runner.output_lines
+
+def bench():
+    for name, source in SAMPLES.items():
+        passes = PassManager()
+        ast = parse_source(source, passes)
+        code, _, names = compile_ast(ast, passes)
+        t_vm, out_vm = best_of(lambda: VM(code, names, output=CollectorSink()))
+        t_closure, out_closure = best_of(lambda: ClosureProgram(ast, CollectorSink()))
+        start = time.perf_counter()
+        program = PythonProgram.from_ast(ast)
+        t_compile = time.perf_counter() - start
+        t_python, out_python = best_of(lambda: PythonProgram(program.code, program.names, CollectorSink()))
+        assert out_vm == out_closure == out_python
+        print(f'{name:<14} vm {t_vm:6.3f}s   closures {t_closure:6.3f}s ({t_vm / t_closure:5.2f}x)'
+              f'   python {t_python:6.3f}s ({t_vm / t_python:5.2f}x, compile {t_compile * 1000:.1f} ms)')
+
+if __name__ == '__main__':
+    bench()
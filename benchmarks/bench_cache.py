@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from src.compiler.cache import CACHE_DIR_ENV, HASH_CHUNK_SIZE, BytecodeCache
+from src.compiler.passes import PassManager
+from src.utils.helpers import compile_file, compile_file_cached
+from benchmarks.programs import generated_program
+
+def script(blocks: int) -> str:
+    # Like generated_program, but with values that stay small, so that it
+    # can also be run
+    lines = ['x = 1;', 'y = 0;']
+    for b in range(blocks):
+        lines.append(f'x = (x * 7 + {b % 97}) / 3 - x / 2;')
+        lines.append(f'if (x > {b % 13} && !(y == x)) {{ y += x / 5; }} else {{ y -= 1; }}')
+    lines.append('print x;')
+    lines.append('print y;')
+    return '\n'.join(lines) + '\n'
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench(blocks: int = 5000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'prog.oil')
+        with open(path, 'w') as f:
+            f.write(generated_program(blocks))
+        runnable = os.path.join(tmp, 'job.oil')
+        with open(runnable, 'w') as f:
+            f.write(script(blocks))
+        cache = BytecodeCache(os.path.join(tmp, 'cache'))
+        passes = PassManager()
+        print(f'input: {os.path.getsize(path)} bytes')
+
+        compile_time = best_of(lambda: compile_file(path, passes=passes))
+        hit_time = best_of(lambda: compile_file_cached(path, passes, cache))
+        code, line_info, names = compile_file(path, passes=passes)
+        cached, cached_lines, cached_names = compile_file_cached(path, passes, cache)
+        assert (cached.instructions(), cached_lines, cached_names) == (code, line_info, names)
+        print(f'compile from source  {compile_time * 1000:9.2f} ms')
+        print(f'load from cache      {hit_time * 1000:9.2f} ms  ({compile_time / hit_time:.1f}x)')
+
+        # The key is hashed a chunk at a time, never from the whole file
+        pass_names = passes.ast_passes + passes.bytecode_passes
+        tracemalloc.start()
+        with open(path, 'rb') as f:
+            key = cache.stream_key(f, pass_names)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with open(path, 'rb') as f:
+            assert key == cache.key(f.read(), pass_names)
+        print(f'cache key peak       {peak / 1024:9.0f} kB')
+        assert peak < 4 * HASH_CHUNK_SIZE
+
+        # Whole process start to exit, as a cron job sees it
+        print(f'job: {os.path.getsize(runnable)} bytes')
+        env = dict(os.environ, **{CACHE_DIR_ENV: cache.directory})
+        for flags, label in ((['--no-cache'], 'main.py, no cache'), ([], 'main.py, cached')):
+            elapsed = best_of(lambda: subprocess.run(
+                [sys.executable, 'main.py', *flags, runnable], env=env,
+                stdout=subprocess.DEVNULL, check=True), repeat=3)
+            print(f'{label:<20} {elapsed * 1000:9.2f} ms')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,53 @@
+import gc
+import marshal
+import time
+import tracemalloc
+from src.compiler.codeobject import CodeObject
+from src.compiler.linetable import LineTable
+from src.utils.helpers import compile_source
+from benchmarks.programs import generated_program
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench():
+    code, lines, names = compile_source(generated_program(5000))
+    n = len(code)
+    print(f'instructions: {n}')
+
+    # A fresh list of fresh tuples, as the compiler holds it
+    _, list_size = measure(lambda: [(op, arg) for op, arg in code])
+    packed, packed_size = measure(lambda: CodeObject.pack(code, names))
+    print(f'memory     tuples {list_size / n:6.1f} B/instr   packed {packed_size / n:6.1f} B/instr'
+          f'   ({list_size / packed_size:.1f}x smaller)')
+
+    list_bytes = marshal.dumps((code, names))
+    packed_bytes = packed.to_bytes()
+    print(f'serialised tuples {len(list_bytes):8} B        packed {len(packed_bytes):8} B')
+    t_list = best_of(lambda: marshal.loads(list_bytes))
+    t_packed = best_of(lambda: CodeObject.from_bytes(packed_bytes))
+    print(f'load       tuples {t_list * 1000:7.2f} ms       packed {t_packed * 1000:7.2f} ms')
+    assert CodeObject.from_bytes(packed_bytes).instructions() == code
+
+    # Line info as the per-instruction dict it used to be, and as a table
+    per_instr = lines.lines()
+    _, dict_size = measure(lambda: {i: line for i, line in enumerate(per_instr)})
+    _, table_size = measure(lambda: LineTable.from_lines(per_instr))
+    print(f'lines      dict   {dict_size / n:6.1f} B/instr   table  {table_size / n:6.1f} B/instr'
+          f'   ({dict_size / table_size:.1f}x smaller)')
+
+if __name__ == '__main__':
+    bench()
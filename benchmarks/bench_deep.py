@@ -0,0 +1,35 @@
+import sys
+import time
+from src.lexer.lexer import Lexer
+from src.parser.parser import Parser
+from src.compiler.compiler import Compiler
+
+def long_chain(n: int) -> str:
+    return 'x = ' + ' + '.join(['a'] * n) + ';\n'
+
+def nested_parens(n: int) -> str:
+    return 'x = ' + '(' * n + 'a' + ' + 1)' * n + ';\n'
+
+def nested_ifs(n: int) -> str:
+    return 'if (a) {\n' * n + 'x += 1;\n' + '}\n' * n
+
+def nested_nots(n: int) -> str:
+    return 'x = ' + '!' * n + 'a;\n'
+
+def bench():
+    print(f'recursion limit: {sys.getrecursionlimit()}')
+    lexer = Lexer()
+    for name, make in (('a+a+...+a', long_chain), ('((...))', nested_parens),
+                       ('nested if', nested_ifs), ('!!...!a', nested_nots)):
+        for depth in (1000, 10000, 100000):
+            tokens = lexer.lex_packed(make(depth))
+            start = time.perf_counter()
+            nodes = Parser(tokens).parse()
+            parsed = time.perf_counter()
+            code, _, _ = Compiler().compile_program(nodes)
+            done = time.perf_counter()
+            print(f'{name:<10} depth {depth:>6}: parse {len(tokens) / (parsed - start):>10,.0f} tokens/s'
+                  f'  compile {len(code) / (done - parsed):>10,.0f} instrs/s')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import time
+from src.vm.vm import VM
+
+# Straight-line kernels, one per opcode, repeated to fill the code. Slot 0
+# holds 7 and slot 1 holds 3; every kernel leaves the stack as it found it,
+# and the opcode it is named after is one of its instructions.
+NAMES = ['x', 'y', 'z']
+SETUP = [('CONST', 7), ('STORE_SLOT', 0), ('CONST', 3), ('STORE_SLOT', 1)]
+
+def _binary(op):
+    return [('LOAD_SLOT', 0), ('LOAD_SLOT', 1), (op, None), ('STORE_SLOT', 2)]
+
+KERNELS = {
+    'CONST': [('CONST', 1), ('STORE_SLOT', 2)],
+    'LOAD_SLOT': [('LOAD_SLOT', 0), ('STORE_SLOT', 2)],
+    'STORE_SLOT': [('LOAD_SLOT', 1), ('STORE_SLOT', 2)],
+    **{op: _binary(op) for op in ('ADD', 'SUB', 'MUL', 'DIV', 'IDIV', 'EQ', 'NE', 'LT', 'LE',
+                                  'GT', 'GE', 'AND', 'OR')},
+    'NOT': [('LOAD_SLOT', 0), ('NOT', None), ('STORE_SLOT', 2)],
+    'DUP': [('LOAD_SLOT', 0), ('DUP', None), ('STORE_SLOT', 2), ('STORE_SLOT', 2)],
+    'PRINT': [('LOAD_SLOT', 0), ('PRINT', None)],
+    # Jump targets are filled in by kernel_code: each jumps to the next instruction
+    'JUMP': [('JUMP', None)],
+    'JUMP_IF_FALSE': [('LOAD_SLOT', 0), ('JUMP_IF_FALSE', None)],
+    'JUMP_IF_TRUE': [('LOAD_SLOT', 0), ('JUMP_IF_TRUE', None)],
+    'INC_VAR': [('INC_VAR', (2, 1))],
+    'STORE_CONST': [('STORE_CONST', (2, 5))],
+    'LOAD_CONST_OP': [('LOAD_CONST_OP', (0, 2, 'ADD')), ('STORE_SLOT', 2)],
+    'COMPARE_JUMP': [('COMPARE_JUMP', (0, 1, 'LT', None))],
+    'COMPARE_CONST_JUMP': [('COMPARE_CONST_JUMP', (0, 5, 'GT', None))],
+}
+
+def kernel_code(kernel, repeat: int):
+    code = list(SETUP)
+    for _ in range(repeat):
+        for op, arg in kernel:
+            target = len(code) + 1
+            if op in ('JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE'):
+                arg = target
+            elif op in ('COMPARE_JUMP', 'COMPARE_CONST_JUMP'):
+                arg = arg[:-1] + (target,)
+            code.append((op, arg))
+    code.append(('HALT', None))
+    return code
+
+def run(code, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        vm = VM(code, NAMES)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            vm.run()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def bench(instructions: int = 200000):
+    total_instructions = total_time = 0
+    print(f'{"opcode":<20} {"Minstr/s":>9}')
+    for name, kernel in KERNELS.items():
+        code = kernel_code(kernel, instructions // len(kernel))
+        elapsed = run(code)
+        total_instructions += len(code)
+        total_time += elapsed
+        print(f'{name:<20} {len(code) / elapsed / 1e6:9.2f}')
+    print(f'{"all":<20} {total_instructions / total_time / 1e6:9.2f}')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,86 @@
+import random
+import time
+from src.incremental import IncrementalCompiler
+from src.utils.helpers import compile_source
+from src.exceptions import OilRuntimeError
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.programs import generated_program
+
+def outcome(code, names, lines):
+    # What running the program leaves behind, or the error it stops with
+    vm = VM(code, names, lines, output=CollectorSink())
+    try:
+        vm.run()
+    except OilRuntimeError as e:
+        return e.message, e.line_num
+    return vm.env, vm.output_lines
+
+def edit_time(inc, edits: int, seed: int = 0):
+    """Average time of an edit, over two kinds of edit.
+
+    Returns (line inserted at the top and taken out again, constant of a
+    random assignment rewritten as a generator would), and the average
+    number of characters the second re-lexes.
+    """
+    start = time.perf_counter()
+    for _ in range(edits):
+        # Moves every later statement down a line, then back up
+        inc.edit(0, 0, 'x = 1;\n')
+        inc.edit(0, 7, '')
+    top = (time.perf_counter() - start) / (2 * edits)
+
+    rng = random.Random(seed)
+    relexed = 0
+    elapsed = 0.0
+    for _ in range(edits):
+        src = inc.source
+        pos = src.find(' + ', rng.randrange(len(src) - 100)) + 3
+        end = pos
+        while src[end].isdigit():
+            end += 1
+        start = time.perf_counter()
+        inc.edit(pos, end, str(rng.randint(1, 99)))
+        elapsed += time.perf_counter() - start
+        relexed += inc.last_edit[0]
+    return top, elapsed / edits, relexed / edits
+
+def bench(sizes=(1250, 20000), edits: int = 200):
+    times = []
+    for blocks in sizes:
+        source = generated_program(blocks)
+        start = time.perf_counter()
+        inc = IncrementalCompiler(source)
+        build = time.perf_counter() - start
+        print(f'input: {len(source)} chars, {len(inc.units)} top-level statements')
+        print(f'initial build        {build * 1000:9.2f} ms')
+
+        start = time.perf_counter()
+        compile_source(source)
+        full = time.perf_counter() - start
+        print(f'full compile         {full * 1000:9.2f} ms')
+
+        top, rewrite, relexed = edit_time(inc, edits)
+        print(f'insert line at top   {top * 1000:9.2f} ms')
+        print(f'rewrite constant     {rewrite * 1000:9.2f} ms  (avg {relexed:.0f} chars re-lexed)')
+        start = time.perf_counter()
+        code, lines, names = inc.program()
+        print(f'link program         {(time.perf_counter() - start) * 1000:9.2f} ms')
+        times.append((top, rewrite))
+
+        # Statements are optimised one at a time, so the code can differ from
+        # a full compile's where a pass would have looked across two
+        # statements; what the program does may not
+        assert len(lines) == len(code)
+        ref_code, ref_lines, ref_names = compile_source(inc.source)
+        assert outcome(code, names, lines) == outcome(ref_code, ref_names, ref_lines)
+
+    # An edit costs about as much as the statements it touches: the same
+    # edit in a file many times larger takes barely longer
+    growth = sizes[1] / sizes[0]
+    for (small, large), label in zip(zip(*times), ('insert line at top', 'rewrite constant')):
+        print(f'{label:<20} {large / small:9.2f}x slower on a {growth:.0f}x larger file')
+        assert large / small < growth / 4
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,51 @@
+import random
+import time
+from src.lexer.lexer import Lexer, LEXER_BACKENDS
+from benchmarks.programs import generated_program
+
+EDGE_CASES = [
+    '1while', 'whilex', 'while1', '_if', 'if_', 'iff', 'else{', 'print(1);',
+    'a=<b', 'a<==b', 'x%=3', 'x^=1', 'a&&b||!c', 'x//y\nz', 'x/=y', '//', '/',
+    '12abc', 'éwhile', 'whileé', '٣', '\t\r\n', '',
+]
+FUZZ_ALPHABET = ['while', 'if', 'else', 'print', 'x', '_', '7', ' ', '\n', '+', '-',
+                 '*', '/', '%', '&', '|', '^', '=', '!', '<', '>', '(', ')', '{', '}',
+                 ';', 'é', '٣']
+
+def conformance_corpus(cases: int = 5000, seed: int = 0):
+    rng = random.Random(seed)
+    yield generated_program(50)
+    yield from EDGE_CASES
+    for _ in range(cases):
+        yield ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 30)))
+
+def check_conformance():
+    reference = Lexer('regex')
+    others = [Lexer(name) for name in LEXER_BACKENDS if name != 'regex']
+    count = 0
+    for source in conformance_corpus():
+        expected = list(reference.scan(source))
+        for lexer in others:
+            got = list(lexer.scan(source))
+            if got != expected:
+                raise AssertionError(f'{lexer.backend} backend differs on {source!r}:\n{got}\n{expected}')
+        count += 1
+    print(f'conformance: {count} inputs identical across {", ".join(LEXER_BACKENDS)}')
+
+def bench(repeat: int = 5):
+    source = generated_program(5000)
+    print(f'input: {len(source)} chars')
+    for name in LEXER_BACKENDS:
+        lexer = Lexer(name)
+        for method in ('lex', 'lex_packed'):
+            fn = getattr(lexer, method)
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                tokens = fn(source)
+                best = min(best, time.perf_counter() - start)
+            print(f'{name:>6} {method:<11} {len(tokens) / best:>12,.0f} tokens/s')
+
+if __name__ == '__main__':
+    check_conformance()
+    bench()
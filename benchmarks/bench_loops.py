@@ -0,0 +1,73 @@
+import time
+from src.compiler.passes import OPT_LEVELS, PassManager
+from src.utils.helpers import compile_ast, parse_source
+from src.vm.closures import ClosureProgram
+from src.vm.transpile import PythonProgram
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.programs import counting_loop
+
+SAMPLES = {
+    'invariant bound': '''
+limit = 50000;
+scale = 7;
+i = 0;
+total = 0;
+while (i < limit * 2) {
+    total += i * 3 + scale * scale - scale;
+    i += 1;
+}
+print total;
+''',
+    'strided index': '''
+i = 0;
+lo = 0;
+hi = 0;
+while (i < 100000) {
+    lo += i * 4;
+    hi += i * 4 + 3;
+    i += 1;
+}
+print lo;
+print hi;
+''',
+    # Nothing to move or reduce; shows the noise level
+    'counting loop': counting_loop(100000),
+}
+
+WITH_LOOPS = OPT_LEVELS[2]
+WITHOUT_LOOPS = tuple(name for name in WITH_LOOPS if name != 'loops')
+
+def best_of(make, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        runner = make()
+        start = time.perf_counter()
+        runner.run()
+        best = min(best, time.perf_counter() - start)
+    return best, runner.output_lines
+
+def run_backends(source: str, pass_names):
+    passes = PassManager(passes=pass_names)
+    ast = parse_source(source, passes)
+    code, _, names = compile_ast(ast, passes)
+    python = PythonProgram.from_ast(ast)
+    return {
+        'vm': best_of(lambda: VM(code, names, output=CollectorSink())),
+        'closure': best_of(lambda: ClosureProgram(ast, CollectorSink())),
+        'python': best_of(lambda: PythonProgram(python.code, python.names, CollectorSink())),
+    }
+
+def bench():
+    for name, source in SAMPLES.items():
+        before = run_backends(source, WITHOUT_LOOPS)
+        after = run_backends(source, WITH_LOOPS)
+        cells = []
+        for backend in before:
+            (t0, out0), (t1, out1) = before[backend], after[backend]
+            assert out0 == out1
+            cells.append(f'{backend} {t0:6.3f}s -> {t1:6.3f}s ({t0 / t1:4.2f}x)')
+        print(f'{name:<16} ' + '   '.join(cells))
+
+if __name__ == '__main__':
+    bench()
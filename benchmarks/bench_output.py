@@ -0,0 +1,87 @@
+import io
+import time
+import tracemalloc
+from src.utils.helpers import compile_source
+from src.vm.output import CollectorSink, OutputSink, RingBufferSink, StreamSink
+from src.vm.vm import VM
+
+def chatty(lines: int) -> str:
+    return f'i = 0;\nwhile (i < {lines}) {{\n    print i * 1000003;\n    i += 1;\n}}\n'
+
+class CountingStream(io.StringIO):
+    """Text stream that counts write() calls; on a terminal or an
+    unbuffered file each one is a write syscall."""
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+class Discard(CountingStream):
+    def write(self, s):
+        self.writes += 1
+        return len(s)
+
+class PrintAndKeep(OutputSink):
+    """What PRINT did before sinks: write every line, and keep it too."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lines = []
+
+    def write(self, line: str):
+        self._lines.append(line)
+        self.stream.write(line)
+        self.stream.write('\n')
+
+    @property
+    def lines(self):
+        return self._lines
+
+def measure(code, names, make_sink, repeat: int = 3):
+    """Best run time, and peak memory traced over a separate run."""
+    best = float('inf')
+    for _ in range(repeat):
+        vm = VM(code, names, output=make_sink())
+        start = time.perf_counter()
+        vm.run()
+        best = min(best, time.perf_counter() - start)
+    sink = make_sink()
+    vm = VM(code, names, output=sink)
+    tracemalloc.start()
+    vm.run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, sink
+
+def bench(lines: int = 200000):
+    code, _, names = compile_source(chatty(lines))
+    print(f'{lines} lines printed')
+    print(f'{"sink":<26} {"time":>8} {"peak memory":>12} {"write calls":>12}')
+    variants = {
+        'print and keep (old)': lambda: PrintAndKeep(Discard()),
+        'stream, every line': lambda: StreamSink(Discard(), flush_lines=1),
+        'stream, default policy': lambda: StreamSink(Discard()),
+        'ring buffer, 100 lines': lambda: RingBufferSink(100),
+        'collector': CollectorSink,
+    }
+    for label, make_sink in variants.items():
+        elapsed, peak, sink = measure(code, names, make_sink)
+        stream = getattr(sink, 'stream', None)
+        writes = f'{stream.writes:12}' if stream is not None else f'{"-":>12}'
+        print(f'{label:<26} {elapsed:7.3f}s {peak / 1024:9.0f} kB {writes}')
+
+    # Every sink sees exactly what was printed
+    expected = [str(i * 1000003) for i in range(lines)]
+    sink = StreamSink(CountingStream(), flush_lines=1000)
+    VM(code, names, output=sink).run()
+    assert sink.stream.getvalue() == '\n'.join(expected) + '\n'
+    ring = RingBufferSink(100)
+    VM(code, names, output=ring).run()
+    assert ring.lines == expected[-100:] and ring.dropped == lines - 100
+    collector = CollectorSink()
+    VM(code, names, output=collector).run()
+    assert collector.lines == expected
+
+if __name__ == '__main__':
+    bench()
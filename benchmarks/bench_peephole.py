@@ -0,0 +1,91 @@
+import time
+from src.compiler.passes import PassManager
+from src.utils.helpers import compile_source
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.bench_superinstructions import dispatches
+
+# Each sample holds what the pass rewrites in the compiler's own output:
+# a store and reload of one variable, chains of jumps out of nested
+# branches, a jump to the next instruction left by an empty else, and jumps
+# to HALT from branches at the end of the program.
+SAMPLES = {
+    'store and reload': '''
+i = 0;
+total = 0;
+while (i < 100000) {
+    x = i * 3;
+    y = x / 2 + total;
+    total = y - i;
+    i += 1;
+}
+print total;
+''',
+    'nested branches': '''
+i = 0;
+a = 0;
+b = 0;
+while (i < 100000) {
+    if (i / 2 * 2 == i) {
+        if (i / 3 * 3 == i) {
+            if (i / 5 * 5 == i) { a += 1; } else { b += 1; }
+        } else {
+            b += 2;
+        }
+    } else {
+        a += 2;
+    }
+    i += 1;
+}
+print a;
+print b;
+''',
+    'tail branches': '''
+i = 0;
+n = 0;
+while (i < 100000) {
+    if (i / 7 * 7 == i) { n += 1; } else { }
+    i += 1;
+}
+if (n > 100) { print n; } else { print i; }
+''',
+}
+
+def run(variants, rounds: int = 5):
+    """Best time and final output and env of each (code, names) variant.
+
+    Rounds alternate between the variants so machine noise hits all alike.
+    """
+    best = [float('inf')] * len(variants)
+    results = [None] * len(variants)
+    for _ in range(rounds):
+        for k, (code, names) in enumerate(variants):
+            vm = VM(code, names, output=CollectorSink())
+            start = time.perf_counter()
+            vm.run()
+            best[k] = min(best[k], time.perf_counter() - start)
+            results[k] = (best[k], vm.output_lines, vm.env)
+    return results
+
+def bench():
+    # -O0 against the peephole pass alone, so nothing else changes the code
+    for name, source in SAMPLES.items():
+        passes = PassManager(passes=('peephole',), count=True)
+        variants = []
+        for pm in (PassManager(0), passes):
+            code, _, names = compile_source(source, passes=pm)
+            variants.append((code, names))
+        stats = passes.stats['peephole']
+        (code0, names0), (code1, names1) = variants
+        # Threaded jumps only change targets, which the counts leave out
+        assert code0 != code1, name
+        (t0, out0, env0), (t1, out1, env1) = run(variants)
+        assert out0 == out1 and env0 == env1
+        d0, d1 = dispatches(code0, names0), dispatches(code1, names1)
+        print(f'{name:<17} instructions {len(code0):>3} -> {len(code1):>3}'
+              f' ({stats.removed} removed, {stats.rewritten} rewritten)'
+              f'   dispatches {d0:>8} -> {d1:>8}'
+              f'   run {t0:6.3f}s -> {t1:6.3f}s  ({t0 / t1:4.2f}x)')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,55 @@
+import time
+from src.compiler.passes import PassManager
+from src.utils.helpers import compile_ast, parse_source
+from src.vm.register import RegisterVM, lower
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.bench_backends import SAMPLES
+from benchmarks.bench_superinstructions import dispatches as stack_dispatches
+
+class CountingCode(list):
+    """Register code list that counts instruction fetches, i.e. dispatches."""
+    fetches = 0
+
+    def __getitem__(self, index):
+        self.fetches += 1
+        return list.__getitem__(self, index)
+
+def run(makers, rounds: int = 5):
+    """Best time and final output and env of each runner factory; rounds
+    alternate between them so machine noise hits all alike."""
+    best = [float('inf')] * len(makers)
+    results = [None] * len(makers)
+    for _ in range(rounds):
+        for k, make in enumerate(makers):
+            runner = make()
+            start = time.perf_counter()
+            runner.run()
+            best[k] = min(best[k], time.perf_counter() - start)
+            results[k] = (best[k], runner.output_lines, runner.env)
+    return results
+
+def dispatches(runner: RegisterVM) -> int:
+    runner.code = counted = CountingCode(runner.code)
+    runner.run()
+    return counted.fetches
+
+def bench():
+    # Both run the same AST passes; the stack VM gets its bytecode passes too
+    for name, source in SAMPLES.items():
+        passes = PassManager()
+        ast = parse_source(source, passes)
+        code, _, names = compile_ast(ast, passes)
+        rcode, registers, rnames, lines = lower(ast)
+        (t_stack, out_stack, env_stack), (t_reg, out_reg, env_reg) = run(
+            [lambda: VM(code, names, output=CollectorSink()),
+             lambda: RegisterVM(rcode, registers, rnames, CollectorSink(), lines)])
+        assert out_stack == out_reg and env_stack == env_reg
+        d_stack = stack_dispatches(code, names)
+        d_reg = dispatches(RegisterVM(rcode, registers, rnames, CollectorSink(), lines))
+        print(f'{name:<14} instructions {len(code):>4} -> {len(rcode):>4}'
+              f'   dispatches {d_stack:>9} -> {d_reg:>9}'
+              f'   run {t_stack:6.3f}s -> {t_reg:6.3f}s  ({t_stack / t_reg:4.2f}x)')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from src.utils.helpers import compile_source
+from src.vm.output import CollectorSink
+from src.vm.scheduler import Scheduler, run_all
+from src.vm.vm import VM, SUSPENDED
+
+def counting(limit: int) -> str:
+    return f'i = 0;\ns = 0;\nwhile (i < {limit}) {{\n    s += i;\n    i += 1;\n}}\nprint s;\n'
+
+def best_of(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def slicing_overhead(code, names):
+    """One VM run whole, then in slices of various sizes."""
+    print(f'{"slice steps":<14} {"time":>8}')
+
+    def whole():
+        VM(code, names, output=CollectorSink()).run()
+
+    def sliced(n):
+        vm = VM(code, names, output=CollectorSink())
+        while vm.run(n) == SUSPENDED:
+            pass
+
+    print(f'{"none":<14} {best_of(whole):7.3f}s')
+    for n in (10, 100, 1000, 10000):
+        print(f'{n:<14} {best_of(lambda: sliced(n)):7.3f}s')
+
+def many(code, names, count: int):
+    """count small VMs, one after the other and on the scheduler."""
+    def sequential():
+        for _ in range(count):
+            VM(code, names, output=CollectorSink()).run()
+
+    def scheduled():
+        run_all([VM(code, names, output=CollectorSink()) for _ in range(count)])
+
+    print(f'{count} VMs  sequential {best_of(sequential):7.3f}s  scheduled {best_of(scheduled):7.3f}s')
+
+def latency(short_code, short_names, long_code, long_names, tenants: int):
+    """When the short tenants finish, queued behind one long-running one."""
+    async def timed(scheduler, vm, start, done):
+        await scheduler.run(vm)
+        done.append(time.perf_counter() - start)
+
+    async def scheduled():
+        scheduler = Scheduler()
+        done = []
+        start = time.perf_counter()
+        vms = [VM(long_code, long_names, output=CollectorSink())]
+        vms += [VM(short_code, short_names, output=CollectorSink()) for _ in range(tenants)]
+        await asyncio.gather(*(timed(scheduler, vm, start, done) for vm in vms))
+        return done
+
+    start = time.perf_counter()
+    VM(long_code, long_names, output=CollectorSink()).run()
+    sequential = []
+    for _ in range(tenants):
+        VM(short_code, short_names, output=CollectorSink()).run()
+        sequential.append(time.perf_counter() - start)
+    done = sorted(asyncio.run(scheduled()))[:tenants]
+    print(f'{tenants} short tenants behind a long one, median finish')
+    print(f'  sequential {sequential[tenants // 2] * 1000:8.1f} ms')
+    print(f'  scheduled  {done[tenants // 2] * 1000:8.1f} ms')
+
+def bench():
+    long_code, _, long_names = compile_source(counting(300000))
+    short_code, _, short_names = compile_source(counting(100))
+    slicing_overhead(long_code, long_names)
+    many(short_code, short_names, 1000)
+    latency(short_code, short_names, long_code, long_names, 100)
+
+    # Slicing changes when a program runs, never what it computes
+    expected = VM(long_code, long_names, output=CollectorSink())
+    expected.run()
+    vms = [VM(long_code, long_names, output=CollectorSink()) for _ in range(3)]
+    for vm in run_all(vms, slice_steps=37):
+        assert vm.env == expected.env and vm.output.lines == expected.output.lines
+
+if __name__ == '__main__':
+    bench()
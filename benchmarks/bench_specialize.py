@@ -0,0 +1,76 @@
+import time
+from collections import Counter
+from src.compiler.passes import OPT_LEVELS, PassManager
+from src.compiler.specialize import GENERIC_OPCODES
+from src.utils.helpers import compile_source
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.programs import counting_loop, nested_loops
+
+SAMPLES = {
+    'division loop': '''
+i = 1;
+acc = 0;
+while (i < 100000) {
+    acc = acc + (i * 7 + 3) / (i / 3 + 1) - acc / 5;
+    i += 1;
+}
+print acc;
+''',
+    'mixed arithmetic': '''
+i = 0;
+x = 1;
+y = 2;
+while (i < 60000) {
+    x = (x * 3 + y) / 4 - i / 5;
+    y = (y - x / 4) * 2 / 3 + i / 7;
+    if (x < y) {
+        x = x + y / 9;
+    }
+    i += 1;
+}
+print x;
+print y;
+''',
+    'counting loop': counting_loop(100000),
+    'nested loops': nested_loops(300),
+}
+
+WITH_TYPES = OPT_LEVELS[2]
+WITHOUT_TYPES = tuple(name for name in WITH_TYPES if name != 'specialize')
+
+def run(variants, rounds: int = 5):
+    """Best time and final output and env of each (code, names) variant.
+
+    Rounds alternate between the variants so machine noise hits all alike.
+    """
+    best = [float('inf')] * len(variants)
+    results = [None] * len(variants)
+    for _ in range(rounds):
+        for k, (code, names) in enumerate(variants):
+            vm = VM(code, names, output=CollectorSink())
+            start = time.perf_counter()
+            vm.run()
+            best[k] = min(best[k], time.perf_counter() - start)
+            results[k] = (best[k], vm.output_lines, vm.env)
+    return results
+
+def typed_share(code) -> str:
+    ops = Counter(op for op, _ in code)
+    typed = sum(n for op, n in ops.items() if op in GENERIC_OPCODES)
+    generic = sum(n for op, n in ops.items() if op in GENERIC_OPCODES.values())
+    return f'{typed}/{typed + generic}'
+
+def bench():
+    for name, source in SAMPLES.items():
+        variants = []
+        for pass_names in (WITHOUT_TYPES, WITH_TYPES):
+            code, _, names = compile_source(source, passes=PassManager(passes=pass_names))
+            variants.append((code, names))
+        (t0, out0, env0), (t1, out1, env1) = run(variants)
+        assert out0 == out1 and env0 == env1
+        print(f'{name:<17} typed ops {typed_share(variants[1][0]):>6}'
+              f'   run {t0:6.3f}s -> {t1:6.3f}s  ({t0 / t1:4.2f}x)')
+
+if __name__ == '__main__':
+    bench()
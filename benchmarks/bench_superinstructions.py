@@ -0,0 +1,57 @@
+import time
+from src.compiler.compiler import Compiler
+from src.compiler.passes import PassManager
+from src.lexer.lexer import Lexer
+from src.parser.parser import Parser
+from src.vm.output import CollectorSink
+from src.vm.vm import VM
+from benchmarks.programs import counting_loop, nested_loops
+
+SAMPLES = {
+    'counting loop': counting_loop(100000),
+    'nested loops': nested_loops(300),
+}
+
+class CountingDispatch(list):
+    """Handler list that counts instruction fetches, i.e. dispatches."""
+    fetches = 0
+
+    def __getitem__(self, index):
+        self.fetches += 1
+        return list.__getitem__(self, index)
+
+def compile_with(source: str, superinstructions: bool):
+    passes = PassManager(2 if superinstructions else 1)
+    ast = passes.run_ast(Parser(Lexer().lex_packed(source), source).parse())
+    code, _, names = Compiler(passes).compile_program(ast)
+    return code, names
+
+def run(code, names, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        vm = VM(code, names, output=CollectorSink())
+        start = time.perf_counter()
+        vm.run()
+        best = min(best, time.perf_counter() - start)
+    return best, vm.output_lines, vm.env
+
+def dispatches(code, names) -> int:
+    vm = VM(code, names, output=CollectorSink())
+    vm.dispatch = counted = CountingDispatch(vm.dispatch)
+    vm.run()
+    return counted.fetches
+
+def bench():
+    for name, source in SAMPLES.items():
+        results = {}
+        for fused in (False, True):
+            code, names = compile_with(source, fused)
+            elapsed, output, env = run(code, names)
+            results[fused] = (len(code), dispatches(code, names), elapsed, output, env)
+        (n0, d0, t0, out0, env0), (n1, d1, t1, out1, env1) = results[False], results[True]
+        assert out0 == out1 and env0 == env1
+        print(f'{name:<14} instructions {n0:>4} -> {n1:>4}   dispatches {d0:>9} -> {d1:>9}'
+              f'   run {t0:6.3f}s -> {t1:6.3f}s  ({t0 / t1:4.2f}x)')
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,52 @@
+import random
+
+# Sample OilLang programs shared by the benchmark scripts. Run the
+# benchmarks from the repository root, e.g. `python -m benchmarks.bench_lexer`.
+
+def generated_program(blocks: int = 1000, seed: int = 0) -> str:
+    """Straight-line, branchy code like the output of our script generators."""
+    rng = random.Random(seed)
+    names = [f'v{i}' for i in range(20)]
+    lines = []
+    for b in range(blocks):
+        a, c, d = rng.sample(names, 3)
+        k = rng.randint(1, 99)
+        lines.append(f'// block {b}')
+        lines.append(f'{a} = ({c} + {k}) * {d} - {k} / 3;')
+        lines.append(f'if ({a} > {c} && !({d} == {k})) {{')
+        lines.append(f'    {c} += {a} - 1;')
+        lines.append('} else {')
+        lines.append(f'    {d} -= 2;')
+        lines.append('}')
+        lines.append(f'print {a};')
+    return '\n'.join(lines) + '\n'
+
+def counting_loop(n: int = 100000) -> str:
+    """Tight counted loop with arithmetic and a branch in the body."""
+    return f'''
+i = 0;
+total = 0;
+while (i < {n}) {{
+    total += i * 2 + 1;
+    if (total > 1000000) {{
+        total -= 1000000;
+    }}
+    i += 1;
+}}
+print total;
+'''
+
+def nested_loops(n: int = 300) -> str:
+    return f'''
+i = 0;
+acc = 0;
+while (i < {n}) {{
+    j = 0;
+    while (j < {n}) {{
+        acc = acc + i * j - (acc / 7);
+        j += 1;
+    }}
+    i += 1;
+}}
+print acc;
+'''
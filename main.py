@@ -1,35 +1,49 @@
+import argparse
 import sys
 from src.repl import repl
-from src.utils.helpers import run_source
+from src.utils.helpers import BACKENDS, run_file
+from src.compiler.cache import BytecodeCache
+from src.compiler.passes import DEFAULT_OPT_LEVEL, OPT_LEVELS, PassManager
+from src.exceptions import OilRuntimeError, OilSyntaxError
 
 def main():
-    if len(sys.argv) == 1:
-        repl()
-    elif len(sys.argv) == 2:
-        source_file = sys.argv[1]
+    arg_parser = argparse.ArgumentParser(
+        prog='main.py', description='Run an OilLang program, or start the REPL if none is given.')
+    arg_parser.add_argument('source_file', nargs='?', help='program to run')
+    arg_parser.add_argument('-O', dest='opt_level', type=int, choices=sorted(OPT_LEVELS),
+                            default=DEFAULT_OPT_LEVEL,
+                            help=f'optimisation level: -O0 compiles fastest, -O2 runs fastest '
+                                 f'(default: -O{DEFAULT_OPT_LEVEL})')
+    arg_parser.add_argument('--backend', choices=BACKENDS, default='vm',
+                            help='run on the bytecode VM, as compiled closures, as a Python function '
+                                 'or on the register VM (default: vm)')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='always compile from source instead of using the bytecode '
+                                 'cache in $OILLANG_CACHE_DIR or ~/.cache/oillang')
+    arg_parser.add_argument('--pass-stats', action='store_true',
+                            help='print the time and instruction counts of each optimisation pass')
+    args = arg_parser.parse_args()
+
+    passes = PassManager(args.opt_level, count=args.pass_stats)
+    if args.source_file is None:
+        repl(passes, args.backend)
+    else:
+        source_file = args.source_file
         
         try:
-            with open(source_file, 'r', encoding='utf-8') as f:
-                source_code = f.read()
+            cache = None if args.no_cache else BytecodeCache()
+            code, output = run_file(source_file, passes=passes, backend=args.backend, cache=cache)
         except FileNotFoundError:
             print(f"Error: File '{source_file}' not found.")
             sys.exit(1)
-        
-        # Remove comments
-        source_code_no_comments = re.sub(r'//.*', '', source_code)
-        
-        try:
-            code, output = run_source(source_code_no_comments)
-        except OilSyntaxError as e:
+        except (OilSyntaxError, OilRuntimeError) as e:
             print(f"Error: {e}")
             sys.exit(1)
         except Exception as e:
             print(f"Error during execution: {e}")
             sys.exit(1)
-    else:
-        print("Usage: python oillang.py [source_file.oil]")
-        print("If no file is provided, starts REPL mode.")
-        sys.exit(1)
+    if args.pass_stats:
+        print(passes.report(), file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -23,6 +23,7 @@ TOKEN_SPEC = [
     ('IF',       r'\bif\b'),
     ('ELSE',     r'\belse\b'),
     ('PRINT',    r'\bprint\b'),
+    ('COMMENT',  r'//[^\n]*'),
     ('NUMBER',   r'\d+'),
     ('ID',       r'[A-Za-z_][A-Za-z0-9_]*'),
     ('COMPOUND_OP', r'\+=|-=|\*=|/=|%=|&=|\|=|\^='),
@@ -44,45 +45,51 @@ MASTER_RE = re.compile('|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPEC))
 class Token:
     type: str
     value: Any
+    pos: int = 0
+    line: int = 0
+    col: int = 0
+
+def line_starts(code: str) -> List[int]:
+    # Offset of the first character of every line, built in one pass
+    starts = [0]
+    pos = code.find('\n')
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = code.find('\n', pos + 1)
+    return starts
+
+def source_line(code: str, starts: List[int], line_num: int) -> str:
+    start = starts[line_num - 1]
+    end = starts[line_num] - 1 if line_num < len(starts) else len(code)
+    return code[start:end]
 
 def lex(code: str) -> List[Token]:
-    lines = code.split('\n')
+    starts = line_starts(code)
+    last_line = len(starts)
     tokens = []
+    line_num = 1
+    line_start = 0
+    next_start = starts[1] if last_line > 1 else len(code) + 1
     for m in MASTER_RE.finditer(code):
         typ = m.lastgroup
+        if typ == 'SKIP' or typ == 'COMMENT':
+            continue
         val = m.group()
         start_pos = m.start()
 
-        # Calculate line number and source line
-        line_num = 1
-        current_pos = 0
-        source_line = ""
-        for i, line in enumerate(lines, 1):
-            line_length = len(line) + 1  # +1 for newline
-            if current_pos <= start_pos < current_pos + line_length:
-                line_num = i
-                source_line = line
-                break
-            current_pos += line_length
-        
+        # Tokens arrive in source order, so the line only ever moves forward
+        while start_pos >= next_start:
+            line_num += 1
+            line_start = next_start
+            next_start = starts[line_num] if line_num < last_line else len(code) + 1
+        col = start_pos - line_start + 1
+
         if typ == 'NUMBER':
-            tokens.append(Token('NUMBER', int(val)))
-        elif typ in ('ID', 'WHILE', 'IF', 'ELSE', 'PRINT'):
-            tokens.append(Token(typ, val))
-        elif typ == "COMPOUND_OP":
-            tokens.append(Token('COMPOUND_OP', val))
-        elif typ == 'OP':
-            tokens.append(Token('OP', val))
-        elif typ == 'LOGICAL_OP':
-            tokens.append(Token('LOGICAL_OP', val))
-        elif typ == 'NOT':
-            tokens.append(Token('NOT', val))
-        elif typ in ('LPAREN','RPAREN','LBRACE','RBRACE','SEMI'):
-            tokens.append(Token(typ, val))
-        elif typ == 'SKIP':
-            continue
+            tokens.append(Token('NUMBER', int(val), start_pos, line_num, col))
         elif typ == 'MISMATCH':
-            raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line)
+            raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line(code, starts, line_num))
+        else:
+            tokens.append(Token(typ, val, start_pos, line_num, col))
     return tokens
 
 # -------------------- Parser --------------------
@@ -502,11 +509,8 @@ def repl():
             if not source.strip():
                 continue
             
-            # Remove comments
-            source_no_comments = re.sub(r'//.*', '', source)
-            
             try:
-                code, output = run_source(source_no_comments)
+                code, output = run_source(source)
             except OilSyntaxError as e:
                 print(f"Error: {e}")
             except Exception as e:
@@ -557,11 +561,8 @@ def main():
             print(f"Error: File '{source_file}' not found.")
             sys.exit(1)
         
-        # Remove comments
-        source_code_no_comments = re.sub(r'//.*', '', source_code)
-        
         try:
-            code, output = run_source(source_code_no_comments)
+            code, output = run_source(source_code)
         except OilSyntaxError as e:
             print(f"Error: {e}")
             sys.exit(1)
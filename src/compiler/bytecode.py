@@ -0,0 +1,98 @@
+from typing import Any, List, Sequence, Tuple
+
+Instr = Tuple[str, Any]
+
+# Bump whenever an opcode is added or changes meaning or argument layout;
+# compiled programs cached on disk are keyed by it
+BYTECODE_VERSION = 4
+
+# Fused compare-and-branch opcodes; their argument is a tuple whose last
+# element is the jump target
+FUSED_JUMPS = frozenset(('COMPARE_JUMP', 'COMPARE_CONST_JUMP'))
+# Opcodes that carry an absolute code index
+JUMP_OPS = frozenset(('JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE')) | FUSED_JUMPS
+CONDITIONAL_JUMPS = frozenset(('JUMP_IF_FALSE', 'JUMP_IF_TRUE')) | FUSED_JUMPS
+# Opcodes after which control never falls through to the next instruction
+TERMINATORS = frozenset(('JUMP', 'HALT'))
+# Opcodes that name variables by slot, with the fields of their argument that
+# hold a slot; None means the argument itself is the slot
+SLOT_OPS = {
+    'LOAD_SLOT': None, 'STORE_SLOT': None,
+    'INC_VAR': (0,), 'STORE_CONST': (0,), 'LOAD_CONST_OP': (0,),
+    'COMPARE_JUMP': (0, 1), 'COMPARE_CONST_JUMP': (0,),
+}
+
+def jump_target(op: str, arg: Any) -> int:
+    return arg[-1] if op in FUSED_JUMPS else arg
+
+def with_target(op: str, arg: Any, target: int) -> Instr:
+    if op in FUSED_JUMPS:
+        return (op, arg[:-1] + (target,))
+    return (op, target)
+
+def with_names(code: List[Instr], names: Sequence[str]) -> List[Instr]:
+    """Replace slot numbers with variable names, for listings and comparisons."""
+    result = []
+    for op, arg in code:
+        if op in SLOT_OPS:
+            fields = SLOT_OPS[op]
+            if fields is None:
+                arg = names[arg]
+            else:
+                arg = tuple(names[a] if k in fields else a for k, a in enumerate(arg))
+        result.append((op, arg))
+    return result
+
+def relocate(code: List[Instr], base: int) -> List[Instr]:
+    # Shift the jump targets of a code fragment compiled at index 0 to base
+    if not base:
+        return list(code)
+    return [with_target(op, arg, jump_target(op, arg) + base) if op in JUMP_OPS else (op, arg)
+            for op, arg in code]
+
+def jump_targets(code: List[Instr]) -> set:
+    return {jump_target(op, arg) for op, arg in code if op in JUMP_OPS}
+
+def successors(code: List[Instr], i: int) -> List[int]:
+    op, arg = code[i]
+    if op == 'HALT':
+        return []
+    if op == 'JUMP':
+        return [arg]
+    if op in CONDITIONAL_JUMPS:
+        return [i + 1, jump_target(op, arg)]
+    return [i + 1]
+
+def reachable(code: List[Instr]) -> List[bool]:
+    seen = [False] * len(code)
+    work = [0] if code else []
+    while work:
+        i = work.pop()
+        if i >= len(code) or seen[i]:
+            continue
+        seen[i] = True
+        work.extend(successors(code, i))
+    return seen
+
+def compact(code: List[Instr], line_info: List[int], keep: Sequence[bool]):
+    """Drop the instructions not in keep, retargeting jumps and line_info.
+
+    A jump to a dropped instruction lands on the next kept one.
+    """
+    new_index = []
+    count = 0
+    for k in keep:
+        new_index.append(count)
+        count += k
+    new_index.append(count)
+    new_code = []
+    new_lines = []
+    for i, instr in enumerate(code):
+        if not keep[i]:
+            continue
+        op, arg = instr
+        if op in JUMP_OPS:
+            instr = with_target(op, arg, new_index[jump_target(op, arg)])
+        new_lines.append(line_info[i])
+        new_code.append(instr)
+    return new_code, new_lines
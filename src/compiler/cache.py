@@ -0,0 +1,114 @@
+import hashlib
+import marshal
+import os
+import tempfile
+from src.compiler.bytecode import BYTECODE_VERSION
+from src.compiler.codeobject import CodeObject
+from src.utils.global_vars import version
+from typing import BinaryIO, Optional, Sequence
+
+# On-disk cache of compiled programs, one .oilc file per compilation:
+#
+#   MAGIC, then marshal of (BYTECODE_VERSION, CodeObject.to_bytes())
+#
+# The code object carries its line table, so errors in a cached program
+# still report source lines.
+#
+# Files are named by a hash of everything the output depends on: the
+# source, the OilLang and bytecode versions and the passes run. A file is
+# never changed once written, so an entry found under the right name is
+# always fresh, and stale ones are simply no longer looked up.
+#
+# Writers build the file under a temporary name in the cache directory and
+# os.replace() it into place, so concurrent runs never see a partial file;
+# when two processes compile the same program, both write the same bytes
+# and the last rename wins.
+
+MAGIC = b'OILC'
+CACHE_SUFFIX = '.oilc'
+# Overrides the default cache directory
+CACHE_DIR_ENV = 'OILLANG_CACHE_DIR'
+# Bytes of a source file hashed at a time
+HASH_CHUNK_SIZE = 1 << 16
+
+def default_cache_dir() -> str:
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'oillang')
+
+def dumps(code: CodeObject) -> bytes:
+    return MAGIC + marshal.dumps((BYTECODE_VERSION, code.to_bytes()))
+
+def loads(data: bytes) -> CodeObject:
+    """Inverse of dumps; raises ValueError for anything else."""
+    if not data.startswith(MAGIC):
+        raise ValueError('Not a compiled OilLang file')
+    try:
+        bytecode_version, code = marshal.loads(data[len(MAGIC):])
+        if bytecode_version != BYTECODE_VERSION:
+            raise ValueError(f'Bytecode version {bytecode_version}, expected {BYTECODE_VERSION}')
+        return CodeObject.from_bytes(code)
+    except (EOFError, TypeError, ValueError) as e:
+        raise ValueError(f'Corrupt compiled OilLang file: {e}') from None
+
+class BytecodeCache:
+    """Compiled programs stored in a directory, by cache key.
+
+    The cache only ever speeds things up: a missing, unreadable or corrupt
+    entry is a miss, and an entry that cannot be written is skipped.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or default_cache_dir()
+
+    @staticmethod
+    def _hash(pass_names: Sequence[str]):
+        h = hashlib.sha256()
+        h.update(f'{version}\0{BYTECODE_VERSION}\0{",".join(pass_names)}\0'.encode())
+        return h
+
+    @staticmethod
+    def key(source: bytes, pass_names: Sequence[str]) -> str:
+        h = BytecodeCache._hash(pass_names)
+        h.update(source)
+        return h.hexdigest()
+
+    @staticmethod
+    def stream_key(stream: BinaryIO, pass_names: Sequence[str]) -> str:
+        """key() of everything left in stream, read a chunk at a time."""
+        h = BytecodeCache._hash(pass_names)
+        while True:
+            chunk = stream.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def load(self, key: str) -> Optional[CodeObject]:
+        try:
+            with open(self.path(key), 'rb') as f:
+                return loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, code: CodeObject):
+        data = dumps(code)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=key[:16], suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
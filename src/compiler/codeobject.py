@@ -0,0 +1,148 @@
+import marshal
+from array import array
+from src.compiler.bytecode import Instr, with_names
+from src.compiler.linetable import LineTable
+from typing import Any, List, Optional, Sequence
+
+# Packed form of a compiled program: one byte of opcode and one int of
+# operand per instruction, in two parallel arrays. This is what the VM is
+# given and what the bytecode cache stores; the VM unpacks it once, into a
+# handler and an operand per instruction.
+#
+# The operand of CONST, and the tuple argument of the superinstructions,
+# is an index into the constant pool. LOAD_SLOT and STORE_SLOT carry their
+# slot, which is also the variable's index in the name pool, and jumps
+# their target. Opcodes without an argument store 0. The source line of
+# each instruction is kept in a LineTable.
+
+OPCODES = [
+    'CONST', 'LOAD_SLOT', 'STORE_SLOT',
+    'ADD', 'SUB', 'MUL', 'DIV', 'EQ', 'NE', 'LT', 'LE', 'GT', 'GE',
+    'IDIV',
+    'AND', 'OR', 'NOT', 'DUP', 'PRINT',
+    'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE',
+    'INC_VAR', 'STORE_CONST', 'LOAD_CONST_OP', 'COMPARE_JUMP', 'COMPARE_CONST_JUMP',
+    'HALT',
+]
+OPCODE_NUMBERS = {name: number for number, name in enumerate(OPCODES)}
+
+OP_CONST = OPCODE_NUMBERS['CONST']
+OP_LOAD_SLOT = OPCODE_NUMBERS['LOAD_SLOT']
+OP_STORE_SLOT = OPCODE_NUMBERS['STORE_SLOT']
+OP_ADD = OPCODE_NUMBERS['ADD']
+OP_SUB = OPCODE_NUMBERS['SUB']
+OP_MUL = OPCODE_NUMBERS['MUL']
+OP_DIV = OPCODE_NUMBERS['DIV']
+OP_EQ = OPCODE_NUMBERS['EQ']
+OP_NE = OPCODE_NUMBERS['NE']
+OP_LT = OPCODE_NUMBERS['LT']
+OP_LE = OPCODE_NUMBERS['LE']
+OP_GT = OPCODE_NUMBERS['GT']
+OP_GE = OPCODE_NUMBERS['GE']
+OP_IDIV = OPCODE_NUMBERS['IDIV']
+OP_AND = OPCODE_NUMBERS['AND']
+OP_OR = OPCODE_NUMBERS['OR']
+OP_NOT = OPCODE_NUMBERS['NOT']
+OP_DUP = OPCODE_NUMBERS['DUP']
+OP_PRINT = OPCODE_NUMBERS['PRINT']
+OP_JUMP = OPCODE_NUMBERS['JUMP']
+OP_JUMP_IF_FALSE = OPCODE_NUMBERS['JUMP_IF_FALSE']
+OP_JUMP_IF_TRUE = OPCODE_NUMBERS['JUMP_IF_TRUE']
+OP_INC_VAR = OPCODE_NUMBERS['INC_VAR']
+OP_STORE_CONST = OPCODE_NUMBERS['STORE_CONST']
+OP_LOAD_CONST_OP = OPCODE_NUMBERS['LOAD_CONST_OP']
+OP_COMPARE_JUMP = OPCODE_NUMBERS['COMPARE_JUMP']
+OP_COMPARE_CONST_JUMP = OPCODE_NUMBERS['COMPARE_CONST_JUMP']
+OP_HALT = OPCODE_NUMBERS['HALT']
+
+# Opcodes whose operand is the argument itself, and those whose operand is
+# a constant pool index; any other opcode takes no argument
+DIRECT_ARGS = frozenset(('LOAD_SLOT', 'STORE_SLOT', 'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE'))
+POOLED_ARGS = frozenset(('CONST', 'INC_VAR', 'STORE_CONST', 'LOAD_CONST_OP',
+                         'COMPARE_JUMP', 'COMPARE_CONST_JUMP'))
+POOLED_OPS = frozenset(OPCODE_NUMBERS[name] for name in POOLED_ARGS)
+
+class CodeObject:
+    """A compiled program as parallel ops/args arrays plus constant and name
+    pools and a line table; see the layout above."""
+
+    def __init__(self, ops: array, args: array, consts: List[Any], names: List[str],
+                 lines: Optional[LineTable] = None):
+        self.ops = ops
+        self.args = args
+        self.consts = consts
+        self.names = names
+        self.lines = lines if lines is not None else LineTable()
+
+    @classmethod
+    def pack(cls, code: Sequence[Instr], names: Sequence[str] = (),
+             lines: Optional[LineTable] = None) -> 'CodeObject':
+        ops = array('B')
+        args = array('i')
+        consts = []
+        interned = {}
+        for op, arg in code:
+            number = OPCODE_NUMBERS.get(op)
+            if number is None:
+                raise ValueError(f'Unknown opcode {op}')
+            ops.append(number)
+            if op in DIRECT_ARGS:
+                args.append(arg)
+            elif op in POOLED_ARGS:
+                # Keyed by type too, so that 1 and True stay apart
+                key = (type(arg), arg)
+                idx = interned.get(key)
+                if idx is None:
+                    idx = interned[key] = len(consts)
+                    consts.append(arg)
+                args.append(idx)
+            else:
+                args.append(0)
+        return cls(ops, args, consts, list(names), lines)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def operands(self) -> List[Any]:
+        """Operand of each instruction, pool indices resolved to constants."""
+        consts = self.consts
+        return [consts[arg] if op in POOLED_OPS else arg for op, arg in zip(self.ops, self.args)]
+
+    def instructions(self) -> List[Instr]:
+        """The (op, arg) tuples this was packed from, variables by slot."""
+        code = []
+        for op, arg in zip(self.ops, self.args):
+            name = OPCODES[op]
+            if name in DIRECT_ARGS:
+                code.append((name, arg))
+            elif name in POOLED_ARGS:
+                code.append((name, self.consts[arg]))
+            else:
+                code.append((name, None))
+        return code
+
+    def disassemble(self) -> str:
+        """Numbered listing with variables by name, one instruction a line."""
+        return '\n'.join(f'{idx:03}: {instr}'
+                         for idx, instr in enumerate(with_names(self.instructions(), self.names)))
+
+    def line_at(self, index: int) -> int:
+        return self.lines.line_at(index)
+
+    def to_bytes(self) -> bytes:
+        return marshal.dumps((self.ops.tobytes(), self.args.tobytes(), self.consts, self.names,
+                              self.lines.data))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CodeObject':
+        ops_bytes, args_bytes, consts, names, line_data = marshal.loads(data)
+        ops = array('B')
+        ops.frombytes(ops_bytes)
+        args = array('i')
+        args.frombytes(args_bytes)
+        lines = LineTable(line_data)
+        if len(ops) != len(args) or max(ops, default=0) >= len(OPCODES):
+            raise ValueError('Malformed code object')
+        if len(lines) not in (0, len(ops)):
+            raise ValueError('Line table does not match the code')
+        return cls(ops, args, consts, names, lines)
@@ -1,85 +1,179 @@
+from functools import partial
 from src.parser.ast_nodes import *
-from typing import Any, Tuple, List
+from src.parser.arena import NodeArena
+from src.compiler.passes import PassManager
+from src.compiler.linetable import LineTable
+from typing import Any, Dict, Tuple, List, Optional, Union
+
+BINARY_OPCODES = {
+    '+' : 'ADD', '-' : 'SUB', '*' : 'MUL', '/' : 'DIV',
+    '==' : 'EQ', '!=' : 'NE', '<' : 'LT', '<=' : 'LE', '>' : 'GT', '>=' : 'GE',
+}
+# Compiled to conditional jumps, so the right operand only runs when needed
+LOGICAL_OPS = frozenset(('&&', '||'))
+COMPOUND_OPCODES = {
+    '+=' : 'ADD',
+    '-=' : 'SUB',
+    '*=' : 'MUL',
+    '/=' : 'DIV'
+}
 
 class Compiler:
-    def __init__(self): 
+    def __init__(self, passes: Optional[PassManager] = None,
+                 slots: Optional[Dict[str, int]] = None):
+        # Bytecode passes run by compile_program; PassManager(0) keeps the
+        # code exactly as emitted, for debugging
+        self.passes = passes if passes is not None else PassManager()
+        # Variable name -> slot, numbered in order of first appearance. A
+        # caller compiling a program in pieces can share one mapping.
+        self.slots: Dict[str, int] = {} if slots is None else slots
         self.code: List[Tuple[str, Any]] = []
-        self.line_info = {}
+        # Source line of each instruction, kept in step with code by the
+        # bytecode passes and encoded into a LineTable at the end
+        self.line_info: List[int] = []
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.slots)
+
+    def slot(self, name: str) -> int:
+        idx = self.slots.get(name)
+        if idx is None:
+            idx = self.slots[name] = len(self.slots)
+        return idx
         
     def emit(self, instr: Tuple[str, Any], line_num: int = 0): 
         self.code.append(instr)
-        self.line_info[len(self.code)-1] = line_num
+        self.line_info.append(line_num)
         
     def patch(self, pos: int, target: int): 
         op,_ = self.code[pos]
         self.code[pos] = (op, target)
         
-    def compile_program(self, nodes: List[ASTNode]):
+    def compile_program(self, nodes: Union[List[ASTNode], NodeArena]):
+        if isinstance(nodes, NodeArena):
+            nodes = nodes.statements()
         for n in nodes: 
             self.compile_node(n)
-        self.emit(('HALT', None))
-        return self.code, self.line_info
+        # HALT ends the last statement
+        self.emit(('HALT', None), self.line_info[-1] if self.line_info else 0)
+        self.code, self.line_info = self.passes.run_bytecode(self.code, self.line_info)
+        return self.code, LineTable.from_lines(self.line_info), self.names
         
     def compile_node(self, node: ASTNode):
-        if isinstance(node, Number): 
-            self.emit(('CONST', node.value))
-        elif isinstance(node, Var): 
-            self.emit(('LOAD', node.name))
-        elif isinstance(node, BinOp):
-            self.compile_node(node.left)
-            self.compile_node(node.right)
-            op = node.op
-            op_map = {
-                '+' : 'ADD', '-' : 'SUB', '*' : 'MUL', '/' : 'DIV',
-                '==' : 'EQ', '!=' : 'NE', '<' : 'LT', '<=' : 'LE', '>' : 'GT', '>=' : 'GE',
-                '&&' : 'AND', '||' : 'OR'
-            }
-            self.emit((op_map[op], None))
-        elif isinstance(node, UnOp):
-            self.compile_node(node.expr)
-            if node.op == '!':
-                self.emit(('NOT', None))
-        elif isinstance(node, Assign): 
-            self.compile_node(node.expr)
-            self.emit(('STORE', node.name))
-        elif isinstance(node, CompoundAssign):
-            self.emit(('LOAD', node.name))
-            self.compile_node(node.expr)
-            op_map = {
-                '+=' : 'ADD',
-                '-=' : 'SUB', 
-                '*=' : 'MUL',
-                '/=' : 'DIV'
-            }
-            self.emit((op_map[node.op], None))
-            self.emit(('STORE', node.name))
-        elif isinstance(node, Print): 
-            self.compile_node(node.expr)
-            self.emit(('PRINT', None))
-        elif isinstance(node, While):
-            loop_start = len(self.code)
-            self.compile_node(node.cond)
-            jmp_false_pos = len(self.code)
-            self.emit(('JUMP_IF_FALSE', None))
-            for stmt in node.body:
-                self.compile_node(stmt)
-            self.emit(('JUMP', loop_start))
-            self.patch(jmp_false_pos, len(self.code))
-        elif isinstance(node, If):
-            self.compile_node(node.cond)
-            jif_pos = len(self.code)
-            self.emit(('JUMP_IF_FALSE', None))
-            for s in node.then_block: 
-                self.compile_node(s)
-            if node.else_block is not None:
-                jmp_pos = len(self.code)
-                self.emit(('JUMP', None))
-                else_start = len(self.code)
-                self.patch(jif_pos, else_start)
-                for s in node.else_block: 
-                    self.compile_node(s)
-                self.patch(jmp_pos, len(self.code))
-            else: 
-                self.patch(jif_pos, len(self.code))
-        else: 
-            raise RuntimeError(f'Unknown AST node: {node}')
\ No newline at end of file
+        # Work items are AST nodes still to be compiled, ready-made
+        # instructions, or callables that emit jumps and patch them.
+        # Children are pushed in reverse so they pop in source order, and
+        # nesting depth is bounded by memory rather than the recursion limit.
+        # Forward jumps are collected in lists and patched by patch_here once
+        # their target is emitted. Instructions get the line of the
+        # statement being compiled; a loop's closing jump and the jump over
+        # an else block set it back to their own statement's line first.
+        code = self.code
+        lines = self.line_info
+        work = [node]
+        line = 0
+
+        def emit(instr):
+            code.append(instr)
+            lines.append(line)
+
+        def at_line(n):
+            nonlocal line
+            line = n
+
+        def emit_jump(op, jumps):
+            jumps.append(len(code))
+            emit((op, None))
+
+        def patch_here(jumps):
+            for pos in jumps:
+                self.patch(pos, len(code))
+
+        def branch(node, when, jumps):
+            # Jump to the target of jumps if node's truth value is when,
+            # otherwise fall through; && and || only test what they need
+            if isinstance(node, UnOp) and node.op == '!':
+                work.append(partial(branch, node.expr, not when, jumps))
+            elif isinstance(node, BinOp) and node.op in LOGICAL_OPS:
+                if (node.op == '||') == when:
+                    # a || b jumps if either is true, a && b falls through if either is false
+                    work.append(partial(branch, node.right, when, jumps))
+                    work.append(partial(branch, node.left, when, jumps))
+                else:
+                    # The left operand alone can only decide to fall through
+                    skip = []
+                    work.append(partial(patch_here, skip))
+                    work.append(partial(branch, node.right, when, jumps))
+                    work.append(partial(branch, node.left, not when, skip))
+            else:
+                work.append(partial(emit_jump, 'JUMP_IF_TRUE' if when else 'JUMP_IF_FALSE', jumps))
+                work.append(node)
+
+        while work:
+            node = work.pop()
+            if isinstance(node, tuple):
+                emit(node)
+            elif isinstance(node, Number):
+                emit(('CONST', node.value))
+            elif isinstance(node, Var):
+                emit(('LOAD_SLOT', self.slot(node.name)))
+            elif isinstance(node, BinOp) and node.op in LOGICAL_OPS:
+                # a && b is 0 as soon as a test fails and 1 otherwise; a || b
+                # is 1 as soon as a test passes and 0 otherwise
+                decided = 1 if node.op == '||' else 0
+                jumps, end = [], []
+                work.append(partial(patch_here, end))
+                work.append(('CONST', decided))
+                work.append(partial(patch_here, jumps))
+                work.append(partial(emit_jump, 'JUMP', end))
+                work.append(('CONST', 1 - decided))
+                work.append(partial(branch, node, bool(decided), jumps))
+            elif isinstance(node, BinOp):
+                work.append((BINARY_OPCODES[node.op], None))
+                work.append(node.right)
+                work.append(node.left)
+            elif isinstance(node, UnOp):
+                if node.op == '!':
+                    work.append(('NOT', None))
+                work.append(node.expr)
+            elif isinstance(node, Assign):
+                line = node.line
+                work.append(('STORE_SLOT', self.slot(node.name)))
+                work.append(node.expr)
+            elif isinstance(node, CompoundAssign):
+                line = node.line
+                emit(('LOAD_SLOT', self.slot(node.name)))
+                work.append(('STORE_SLOT', self.slot(node.name)))
+                work.append((COMPOUND_OPCODES[node.op], None))
+                work.append(node.expr)
+            elif isinstance(node, Print):
+                line = node.line
+                work.append(('PRINT', None))
+                work.append(node.expr)
+            elif isinstance(node, While):
+                line = node.line
+                exits = []
+                work.append(partial(patch_here, exits))
+                work.append(('JUMP', len(code)))
+                work.append(partial(at_line, line))
+                work.extend(reversed(node.body))
+                work.append(partial(branch, node.cond, False, exits))
+            elif isinstance(node, If):
+                line = node.line
+                exits = []
+                if node.else_block is not None:
+                    end = []
+                    work.append(partial(patch_here, end))
+                    work.extend(reversed(node.else_block))
+                    work.append(partial(patch_here, exits))
+                    work.append(partial(emit_jump, 'JUMP', end))
+                    work.append(partial(at_line, line))
+                else:
+                    work.append(partial(patch_here, exits))
+                work.extend(reversed(node.then_block))
+                work.append(partial(branch, node.cond, False, exits))
+            elif callable(node):
+                node()
+            else:
+                raise RuntimeError(f'Unknown AST node: {node}')
@@ -0,0 +1,98 @@
+from typing import Iterable, Iterator, List
+
+# Source line of every instruction of a program, stored the way CPython's
+# co_lnotab does: a run of instructions on one line is a pair of bytes,
+#
+#   (instructions in the run, line of the run - line of the previous run)
+#
+# with the first run measured from line 0. The count is unsigned and at
+# most 255, the line delta a signed byte; longer runs are split, and bigger
+# jumps are spread over runs of 0 instructions. Straight-line code costs two
+# bytes per source line rather than a dict entry per instruction.
+
+MAX_RUN = 255
+MAX_DELTA = 127
+MIN_DELTA = -128
+
+class LineTable:
+    """Delta-encoded instruction -> source line map; line 0 means unknown."""
+
+    __slots__ = ('data', 'length')
+
+    def __init__(self, data: bytes = b''):
+        if len(data) % 2:
+            raise ValueError('Malformed line table')
+        self.data = bytes(data)
+        self.length = sum(self.data[0::2])
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[int]) -> 'LineTable':
+        """Encode the line of each instruction, in order."""
+        data = bytearray()
+        prev = 0
+        line = None
+        run = 0
+        for next_line in lines:
+            if next_line == line and run < MAX_RUN:
+                run += 1
+                continue
+            if run:
+                prev = _append_run(data, run, line, prev)
+            line = next_line
+            run = 1
+        if run:
+            _append_run(data, run, line, prev)
+        return cls(bytes(data))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self) -> Iterator[int]:
+        data = self.data
+        line = 0
+        for k in range(0, len(data), 2):
+            delta = data[k + 1]
+            line += delta - 256 if delta > MAX_DELTA else delta
+            for _ in range(data[k]):
+                yield line
+
+    def __eq__(self, other):
+        if isinstance(other, LineTable):
+            return self.data == other.data
+        return NotImplemented
+
+    def __repr__(self):
+        return f'LineTable({self.data!r})'
+
+    def lines(self) -> List[int]:
+        """The line of every instruction, as a list the bytecode passes edit."""
+        return list(self)
+
+    def line_at(self, index: int) -> int:
+        """Line of the instruction at index, or 0 if it has none.
+
+        Walks the table from the start, so it is meant for error reports
+        and profiles, not for the dispatch loop.
+        """
+        if not 0 <= index < self.length:
+            return 0
+        data = self.data
+        line = 0
+        for k in range(0, len(data), 2):
+            delta = data[k + 1]
+            line += delta - 256 if delta > MAX_DELTA else delta
+            index -= data[k]
+            if index < 0:
+                return line
+        return 0
+
+def _append_run(data: bytearray, run: int, line: int, prev: int) -> int:
+    delta = line - prev
+    while delta > MAX_DELTA:
+        data += bytes((0, MAX_DELTA))
+        delta -= MAX_DELTA
+    while delta < MIN_DELTA:
+        data += bytes((0, MIN_DELTA & 0xFF))
+        delta -= MIN_DELTA
+    data += bytes((run, delta & 0xFF))
+    return line
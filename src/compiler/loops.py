@@ -0,0 +1,292 @@
+from src.parser.ast_nodes import *
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Loop optimisations on the AST, run after fold_constants:
+#
+# - Loop-invariant code motion: a subexpression of a while loop that reads
+#   no variable written anywhere in the loop is computed once, into a
+#   temporary, before the loop. Only expressions without '/' are moved,
+#   since evaluating them ahead of time must not be able to fail.
+# - Strength reduction: in a loop whose body steps a variable i exactly
+#   once, with a top-level 'i += c' or 'i -= c', i * k (k a constant) is
+#   read from a temporary that starts at i * k and is stepped by c * k
+#   right after i is. Stepping the temporary costs about as much as one
+#   multiplication, so this is only done for a product used more than once
+#   in the loop.
+#
+# Temporaries are named '$t0', '$t1', ..., which no OilLang identifier can
+# clash with. They are numbered afresh for each top-level statement, so a
+# statement compiles the same on its own as within the whole program.
+# Statements setting up temporaries get the line of their loop, and those
+# stepping them the line of the step they follow.
+
+TEMP_PREFIX = '$'
+
+def _stmt_exprs(stmt: ASTNode) -> List[ASTNode]:
+    if isinstance(stmt, (Assign, CompoundAssign, Print)):
+        return [stmt.expr]
+    if isinstance(stmt, (While, If)):
+        return [stmt.cond]
+    return []
+
+def _blocks(stmt: ASTNode) -> List[List[ASTNode]]:
+    if isinstance(stmt, While):
+        return [stmt.body]
+    if isinstance(stmt, If):
+        return [stmt.then_block] + ([stmt.else_block] if stmt.else_block is not None else [])
+    return []
+
+def _walk(stmts: List[ASTNode]):
+    """Yield every statement in stmts and the blocks nested in them."""
+    stack = list(reversed(stmts))
+    while stack:
+        stmt = stack.pop()
+        yield stmt
+        for block in reversed(_blocks(stmt)):
+            stack.extend(reversed(block))
+
+def write_counts(stmts: List[ASTNode]) -> Dict[str, int]:
+    """How many statements assign each variable, in stmts and nested blocks."""
+    counts = {}
+    for stmt in _walk(stmts):
+        if isinstance(stmt, (Assign, CompoundAssign)):
+            counts[stmt.name] = counts.get(stmt.name, 0) + 1
+    return counts
+
+def map_expressions(stmts: List[ASTNode], fn: Callable[[ASTNode], ASTNode]) -> List[ASTNode]:
+    """Copy of stmts with every top-level expression e replaced by fn(e)."""
+    result = []
+    stack = [(iter(stmts), result)]
+    while stack:
+        stmts_iter, out = stack[-1]
+        stmt = next(stmts_iter, None)
+        if stmt is None:
+            stack.pop()
+        elif isinstance(stmt, Assign):
+            out.append(Assign(stmt.name, fn(stmt.expr), stmt.line))
+        elif isinstance(stmt, CompoundAssign):
+            out.append(CompoundAssign(stmt.name, stmt.op, fn(stmt.expr), stmt.line))
+        elif isinstance(stmt, Print):
+            out.append(Print(fn(stmt.expr), stmt.line))
+        elif isinstance(stmt, While):
+            body = []
+            out.append(While(fn(stmt.cond), body, stmt.line))
+            stack.append((iter(stmt.body), body))
+        elif isinstance(stmt, If):
+            then_block = []
+            else_block = [] if stmt.else_block is not None else None
+            out.append(If(fn(stmt.cond), then_block, else_block, stmt.line))
+            if else_block is not None:
+                stack.append((iter(stmt.else_block), else_block))
+            stack.append((iter(stmt.then_block), then_block))
+        else:
+            out.append(stmt)
+    return result
+
+class _LoopOptimizer:
+    def __init__(self):
+        self.temps = 0
+        # Structural keys: each distinct expression gets a small int, so
+        # equal subexpressions share one temporary
+        self.keys: Dict[Tuple, int] = {}
+
+    def temp(self) -> str:
+        name = f'{TEMP_PREFIX}t{self.temps}'
+        self.temps += 1
+        return name
+
+    def _key(self, parts: Tuple) -> int:
+        key = self.keys.get(parts)
+        if key is None:
+            key = self.keys[parts] = len(self.keys)
+        return key
+
+    def hoist(self, expr: ASTNode, written: Set[str], hoisted: Dict[int, Tuple[str, ASTNode]]) -> ASTNode:
+        """Replace the maximal invariant, division-free subexpressions of expr
+        by temporaries, recording each new one in hoisted."""
+        # Post-order; each result is (new node, key, movable) where movable
+        # means the node is invariant and free of division
+        results = []
+        stack = [(expr, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if isinstance(node, BinOp) and not children_done:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            elif isinstance(node, UnOp) and not children_done:
+                stack.append((node, True))
+                stack.append((node.expr, False))
+            elif isinstance(node, BinOp):
+                right = results.pop()
+                left = results.pop()
+                movable = left[2] and right[2] and node.op != '/'
+                key = self._key(('BinOp', node.op, left[1], right[1]))
+                if not movable:
+                    node = BinOp(node.op, self._place(left, hoisted), self._place(right, hoisted))
+                results.append((node, key, movable))
+            elif isinstance(node, UnOp):
+                inner = results.pop()
+                key = self._key(('UnOp', node.op, inner[1]))
+                if not inner[2]:
+                    node = UnOp(node.op, inner[0])
+                results.append((node, key, inner[2]))
+            elif isinstance(node, Var):
+                results.append((node, self._key(('Var', node.name)), node.name not in written))
+            else:
+                results.append((node, self._key(('Number', node.value)), True))
+        return self._place(results[0], hoisted)
+
+    def _place(self, result, hoisted) -> ASTNode:
+        # A movable operator node is read from its temporary; variables and
+        # constants are as cheap to read as a temporary and stay put
+        node, key, movable = result
+        if not movable or not isinstance(node, (BinOp, UnOp)):
+            return node
+        if key not in hoisted:
+            hoisted[key] = (self.temp(), node)
+        return Var(hoisted[key][0])
+
+    def reduce(self, loop: While, counts: Dict[str, int]) -> Tuple[List[ASTNode], While]:
+        """Strength-reduce i * k in loop for its induction variables."""
+        steps = {}
+        for stmt in loop.body:
+            step = _induction_step(stmt)
+            if step is not None and counts.get(stmt.name) == 1:
+                steps[stmt.name] = step
+        if not steps:
+            return [], loop
+        uses = {}
+        for expr in [loop.cond] + [e for stmt in _walk(loop.body) for e in _stmt_exprs(stmt)]:
+            for key in _products(expr, steps):
+                uses[key] = uses.get(key, 0) + 1
+        reduced = {key: self.temp() for key, count in uses.items() if count > 1}
+        if not reduced:
+            return [], loop
+        def replace(expr):
+            return _replace_products(expr, reduced)
+        cond = replace(loop.cond)
+        body = map_expressions(loop.body, replace)
+        init = []
+        for (name, k), temp in reduced.items():
+            init.append(Assign(temp, BinOp('*', Var(name), Number(k)), loop.line))
+        new_body = []
+        for stmt in body:
+            new_body.append(stmt)
+            if isinstance(stmt, (Assign, CompoundAssign)) and stmt.name in steps:
+                for (name, k), temp in reduced.items():
+                    if name == stmt.name:
+                        new_body.append(CompoundAssign(temp, '+=', Number(steps[name] * k), stmt.line))
+        return init, While(cond, new_body, loop.line)
+
+    def optimize_loop(self, loop: While) -> List[ASTNode]:
+        """Return the statements replacing loop: the code computing its
+        temporaries followed by the rewritten loop."""
+        counts = write_counts(loop.body)
+        written = set(counts)
+        hoisted = {}
+        def hoist(expr):
+            return self.hoist(expr, written, hoisted)
+        loop = While(hoist(loop.cond), map_expressions(loop.body, hoist), loop.line)
+        preamble = [Assign(temp, expr, loop.line) for temp, expr in hoisted.values()]
+        init, loop = self.reduce(loop, counts)
+        return preamble + init + [loop]
+
+def _induction_step(stmt: ASTNode) -> Optional[int]:
+    # The constant step of 'i += c', 'i -= c', 'i = i + c' or 'i = i - c'
+    if isinstance(stmt, CompoundAssign) and stmt.op in ('+=', '-=') and isinstance(stmt.expr, Number):
+        return stmt.expr.value if stmt.op == '+=' else -stmt.expr.value
+    if isinstance(stmt, Assign) and isinstance(stmt.expr, BinOp) and stmt.expr.op in ('+', '-'):
+        left, right = stmt.expr.left, stmt.expr.right
+        if isinstance(left, Var) and left.name == stmt.name and isinstance(right, Number):
+            return right.value if stmt.expr.op == '+' else -right.value
+        if (stmt.expr.op == '+' and isinstance(right, Var) and right.name == stmt.name
+                and isinstance(left, Number)):
+            return left.value
+    return None
+
+def _product_key(node: ASTNode) -> Optional[Tuple[str, int]]:
+    # (i, k) for i * k or k * i
+    if isinstance(node, BinOp) and node.op == '*':
+        var, const = (node.left, node.right) if isinstance(node.left, Var) else (node.right, node.left)
+        if isinstance(var, Var) and isinstance(const, Number):
+            return (var.name, const.value)
+    return None
+
+def _products(expr: ASTNode, steps: Dict[str, int]):
+    """Yield (i, k) for each product of an induction variable in expr."""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        key = _product_key(node)
+        if key is not None and key[0] in steps:
+            yield key
+        elif isinstance(node, BinOp):
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, UnOp):
+            stack.append(node.expr)
+
+def _replace_products(expr: ASTNode, reduced: Dict[Tuple[str, int], str]) -> ASTNode:
+    results = []
+    stack = [(expr, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if isinstance(node, BinOp):
+            key = _product_key(node)
+            if key in reduced:
+                results.append(Var(reduced[key]))
+                continue
+            if children_done:
+                right = results.pop()
+                left = results.pop()
+                if left is node.left and right is node.right:
+                    results.append(node)
+                else:
+                    results.append(BinOp(node.op, left, right))
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        elif isinstance(node, UnOp):
+            if children_done:
+                inner = results.pop()
+                results.append(node if inner is node.expr else UnOp(node.op, inner))
+            else:
+                stack.append((node, True))
+                stack.append((node.expr, False))
+        else:
+            results.append(node)
+    return results[0]
+
+def optimize_loops(nodes: List[ASTNode]) -> List[ASTNode]:
+    """Return a copy of a statement list with loop-invariant code motion and
+    strength reduction applied to every while loop; the input is left
+    untouched."""
+    result = []
+    for top in nodes:
+        optimizer = _LoopOptimizer()
+        # Outer loops are rewritten before the loops nested in them, so an
+        # expression invariant in both is hoisted all the way out
+        stack = [(iter([top]), result)]
+        while stack:
+            stmts, out = stack[-1]
+            stmt = next(stmts, None)
+            if stmt is None:
+                stack.pop()
+            elif isinstance(stmt, While):
+                *before, loop = optimizer.optimize_loop(stmt)
+                out.extend(before)
+                body = []
+                out.append(While(loop.cond, body, loop.line))
+                stack.append((iter(loop.body), body))
+            elif isinstance(stmt, If):
+                then_block = []
+                else_block = [] if stmt.else_block is not None else None
+                out.append(If(stmt.cond, then_block, else_block, stmt.line))
+                if else_block is not None:
+                    stack.append((iter(stmt.else_block), else_block))
+                stack.append((iter(stmt.then_block), then_block))
+            else:
+                out.append(stmt)
+    return result
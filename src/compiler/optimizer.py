@@ -0,0 +1,146 @@
+from src.parser.ast_nodes import *
+from typing import Optional
+
+# Constant evaluation with the same semantics as VM.run: integer division,
+# and 0/1 results for comparisons and logical operators
+FOLD_BINARY = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a // b if isinstance(a, int) and isinstance(b, int) else a / b,
+    '==': lambda a, b: 1 if a == b else 0,
+    '!=': lambda a, b: 1 if a != b else 0,
+    '<': lambda a, b: 1 if a < b else 0,
+    '<=': lambda a, b: 1 if a <= b else 0,
+    '>': lambda a, b: 1 if a > b else 0,
+    '>=': lambda a, b: 1 if a >= b else 0,
+    '&&': lambda a, b: 1 if a and b else 0,
+    '||': lambda a, b: 1 if a or b else 0,
+}
+FOLD_UNARY = {
+    '!': lambda a: 1 if not a else 0,
+}
+
+# Operators whose result is always 0 or 1
+BOOLEAN_OPS = frozenset(('==', '!=', '<', '<=', '>', '>=', '&&', '||', '!'))
+
+def is_boolean(node: ASTNode) -> bool:
+    if isinstance(node, Number):
+        return node.value in (0, 1)
+    return isinstance(node, (BinOp, UnOp)) and node.op in BOOLEAN_OPS
+
+def _fold_binop(node: BinOp, left: ASTNode, right: ASTNode) -> ASTNode:
+    op = node.op
+    if isinstance(left, Number) and isinstance(right, Number):
+        if not (op == '/' and right.value == 0):
+            return Number(FOLD_BINARY[op](left.value, right.value))
+    # Identities; expressions have no side effects, but a dropped operand
+    # could still divide by zero, so only the constant side is removed
+    if isinstance(right, Number):
+        if (op == '+' or op == '-') and right.value == 0:
+            return left
+        if (op == '*' or op == '/') and right.value == 1:
+            return left
+    if isinstance(left, Number):
+        # A constant left operand decides && and || on its own, and the
+        # right operand is then never evaluated
+        if op == '&&':
+            if not left.value:
+                return Number(0)
+            if is_boolean(right):
+                return right
+        if op == '||':
+            if left.value:
+                return Number(1)
+            if is_boolean(right):
+                return right
+        if op == '+' and left.value == 0:
+            return right
+        if op == '*' and left.value == 1:
+            return right
+    if left is node.left and right is node.right:
+        return node
+    return BinOp(op, left, right)
+
+def _fold_unop(node: UnOp, expr: ASTNode) -> ASTNode:
+    if isinstance(expr, Number):
+        return Number(FOLD_UNARY[node.op](expr.value))
+    # !!x is x when x is already 0 or 1
+    if node.op == '!' and isinstance(expr, UnOp) and expr.op == '!' and is_boolean(expr.expr):
+        return expr.expr
+    if expr is node.expr:
+        return node
+    return UnOp(node.op, expr)
+
+def fold_expr(node: ASTNode) -> ASTNode:
+    """Fold constant subexpressions and simplify identities in one expression."""
+    results = []
+    stack = [(node, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if isinstance(node, BinOp):
+            if children_done:
+                right = results.pop()
+                results[-1] = _fold_binop(node, results[-1], right)
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        elif isinstance(node, UnOp):
+            if children_done:
+                results[-1] = _fold_unop(node, results[-1])
+            else:
+                stack.append((node, True))
+                stack.append((node.expr, False))
+        else:
+            results.append(node)
+    return results[0]
+
+def constant_value(node: ASTNode) -> Optional[int]:
+    return node.value if isinstance(node, Number) else None
+
+def fold_constants(nodes: List[ASTNode]) -> List[ASTNode]:
+    """Return a folded copy of a statement list; the input is left untouched.
+
+    Expressions are folded with fold_expr, 'if' statements with a constant
+    condition are replaced by the branch that runs and 'while' loops whose
+    condition is constantly false are dropped.
+    """
+    result = []
+    # Each frame is (statements still to visit, list receiving the output)
+    stack = [(iter(nodes), result)]
+    while stack:
+        stmts, out = stack[-1]
+        stmt = next(stmts, None)
+        if stmt is None:
+            stack.pop()
+        elif isinstance(stmt, Assign):
+            out.append(Assign(stmt.name, fold_expr(stmt.expr), stmt.line))
+        elif isinstance(stmt, CompoundAssign):
+            out.append(CompoundAssign(stmt.name, stmt.op, fold_expr(stmt.expr), stmt.line))
+        elif isinstance(stmt, Print):
+            out.append(Print(fold_expr(stmt.expr), stmt.line))
+        elif isinstance(stmt, While):
+            cond = fold_expr(stmt.cond)
+            if constant_value(cond) == 0:
+                continue
+            body = []
+            out.append(While(cond, body, stmt.line))
+            stack.append((iter(stmt.body), body))
+        elif isinstance(stmt, If):
+            cond = fold_expr(stmt.cond)
+            value = constant_value(cond)
+            if value is not None:
+                # Splice the branch that runs into the enclosing block
+                branch = stmt.then_block if value else (stmt.else_block or [])
+                stack.append((iter(branch), out))
+                continue
+            then_block = []
+            else_block = [] if stmt.else_block is not None else None
+            out.append(If(cond, then_block, else_block, stmt.line))
+            if else_block is not None:
+                stack.append((iter(stmt.else_block), else_block))
+            stack.append((iter(stmt.then_block), then_block))
+        else:
+            out.append(stmt)
+    return result
@@ -0,0 +1,152 @@
+import time
+from collections import Counter
+from dataclasses import dataclass
+from src.parser.ast_nodes import *
+from src.compiler.bytecode import FUSED_JUMPS, JUMP_OPS, Instr
+from src.compiler.optimizer import fold_constants
+from src.compiler.loops import optimize_loops
+from src.compiler.peephole import optimize
+from src.compiler.specialize import specialize
+from src.compiler.superinstructions import fuse
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# AST passes take and return a statement list; bytecode passes take and
+# return (code, line_info), line_info holding the line of each instruction
+AST_PASSES = {
+    'fold': fold_constants,
+    'loops': optimize_loops,
+}
+BYTECODE_PASSES = {
+    'peephole': optimize,
+    'superinstructions': fuse,
+    'specialize': specialize,
+}
+
+# Passes run at each optimisation level, in order. -O0 compiles fastest and
+# suits short one-off scripts; -O2 spends more compile time for faster loops.
+OPT_LEVELS = {
+    0: (),
+    1: ('fold', 'peephole'),
+    2: ('fold', 'loops', 'peephole', 'superinstructions', 'specialize'),
+}
+DEFAULT_OPT_LEVEL = 2
+
+@dataclass(slots=True)
+class PassStats:
+    """Totals for one pass over every time it has run.
+
+    removed and rewritten count AST nodes for AST passes and instructions
+    for bytecode passes.
+    """
+    name: str
+    runs: int = 0
+    seconds: float = 0.0
+    removed: int = 0
+    rewritten: int = 0
+
+def _node_labels(nodes: Iterable[ASTNode]) -> Iterator[Tuple]:
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Number):
+            yield ('Number', node.value)
+        elif isinstance(node, Var):
+            yield ('Var', node.name)
+        elif isinstance(node, BinOp):
+            yield ('BinOp', node.op)
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, UnOp):
+            yield ('UnOp', node.op)
+            stack.append(node.expr)
+        elif isinstance(node, Assign):
+            yield ('Assign', node.name)
+            stack.append(node.expr)
+        elif isinstance(node, CompoundAssign):
+            yield ('CompoundAssign', node.name, node.op)
+            stack.append(node.expr)
+        elif isinstance(node, Print):
+            yield ('Print',)
+            stack.append(node.expr)
+        elif isinstance(node, While):
+            yield ('While',)
+            stack.extend(node.body)
+            stack.append(node.cond)
+        elif isinstance(node, If):
+            yield ('If', node.else_block is not None)
+            stack.extend(node.else_block or ())
+            stack.extend(node.then_block)
+            stack.append(node.cond)
+
+def _instr_labels(code: Sequence[Instr]) -> Iterator[Tuple]:
+    # Jump targets are left out, so a jump only moved by compaction does
+    # not count as rewritten
+    for op, arg in code:
+        if op in FUSED_JUMPS:
+            yield (op, arg[:-1])
+        elif op in JUMP_OPS:
+            yield (op,)
+        else:
+            yield (op, arg)
+
+def _diff(before: Counter, after: Counter) -> Tuple[int, int]:
+    removed = max(0, sum(before.values()) - sum(after.values()))
+    rewritten = sum((after - before).values())
+    return removed, rewritten
+
+class PassManager:
+    """Runs the AST and bytecode passes of an optimisation level and keeps
+    per-pass timings in self.stats.
+
+    With count=True the nodes or instructions each pass removed or rewrote
+    are counted too. Counting walks the whole program before and after every
+    pass, so it is off by default.
+    """
+
+    def __init__(self, opt_level: int = DEFAULT_OPT_LEVEL, passes: Optional[Sequence[str]] = None,
+                 count: bool = False):
+        if passes is None:
+            if opt_level not in OPT_LEVELS:
+                raise ValueError(f'Unknown optimisation level {opt_level}; '
+                                 f'expected one of {sorted(OPT_LEVELS)}')
+            passes = OPT_LEVELS[opt_level]
+        for name in passes:
+            if name not in AST_PASSES and name not in BYTECODE_PASSES:
+                raise ValueError(f'Unknown pass {name!r}')
+        self.opt_level = opt_level
+        self.count = count
+        self.ast_passes = [name for name in passes if name in AST_PASSES]
+        self.bytecode_passes = [name for name in passes if name in BYTECODE_PASSES]
+        self.stats: Dict[str, PassStats] = {name: PassStats(name) for name in passes}
+
+    def _run(self, name: str, func, labels, program, *args):
+        stats = self.stats[name]
+        before = Counter(labels(program)) if self.count else None
+        start = time.perf_counter()
+        result = func(program, *args)
+        stats.seconds += time.perf_counter() - start
+        stats.runs += 1
+        if self.count:
+            after = Counter(labels(result[0] if args else result))
+            removed, rewritten = _diff(before, after)
+            stats.removed += removed
+            stats.rewritten += rewritten
+        return result
+
+    def run_ast(self, nodes: List[ASTNode]) -> List[ASTNode]:
+        for name in self.ast_passes:
+            nodes = self._run(name, AST_PASSES[name], _node_labels, nodes)
+        return nodes
+
+    def run_bytecode(self, code: List[Instr], line_info: List[int]):
+        for name in self.bytecode_passes:
+            code, line_info = self._run(name, BYTECODE_PASSES[name], _instr_labels, code, line_info)
+        return code, line_info
+
+    def report(self) -> str:
+        lines = [f'{"pass":<18} {"runs":>5} {"time (ms)":>10}'
+                 + (f' {"removed":>8} {"rewritten":>9}' if self.count else '')]
+        for s in self.stats.values():
+            lines.append(f'{s.name:<18} {s.runs:>5} {s.seconds * 1000:>10.3f}'
+                         + (f' {s.removed:>8} {s.rewritten:>9}' if self.count else ''))
+        return '\n'.join(lines)
@@ -0,0 +1,78 @@
+from src.compiler.bytecode import JUMP_OPS, Instr, compact, jump_target, jump_targets, reachable, with_target
+from typing import List, Tuple
+
+INVERTED_JUMPS = {'JUMP_IF_FALSE': 'JUMP_IF_TRUE', 'JUMP_IF_TRUE': 'JUMP_IF_FALSE'}
+
+def _final_target(code: List[Instr], target: int) -> int:
+    # Follow a chain of unconditional jumps; a cycle stops where it started
+    seen = set()
+    while target < len(code) and code[target][0] == 'JUMP' and target not in seen:
+        seen.add(target)
+        target = code[target][1]
+    return target
+
+def thread_jumps(code: List[Instr]) -> int:
+    changed = 0
+    for i, (op, arg) in enumerate(code):
+        if op not in JUMP_OPS:
+            continue
+        old = jump_target(op, arg)
+        target = _final_target(code, old)
+        if op == 'JUMP' and target < len(code) and code[target][0] == 'HALT':
+            code[i] = ('HALT', None)
+            changed += 1
+        elif target != old:
+            code[i] = with_target(op, arg, target)
+            changed += 1
+    return changed
+
+def rewrite_pairs(code: List[Instr], keep: List[bool]) -> int:
+    # Rewrites that look at two adjacent instructions. The second one must
+    # not be a jump target, since jumping to it skips the first.
+    targets = jump_targets(code)
+    changed = 0
+    i = 0
+    while i < len(code) - 1:
+        (op, arg), (next_op, next_arg) = code[i], code[i+1]
+        if op == 'JUMP' and arg == i + 1:
+            keep[i] = False
+            changed += 1
+        elif i + 1 not in targets:
+            if op == 'NOT' and next_op in INVERTED_JUMPS:
+                # NOT; JUMP_IF_FALSE t  ->  JUMP_IF_TRUE t
+                keep[i] = False
+                code[i+1] = (INVERTED_JUMPS[next_op], next_arg)
+                changed += 1
+                i += 2
+                continue
+            if op == 'STORE_SLOT' and next_op == 'LOAD_SLOT' and next_arg == arg:
+                # STORE_SLOT x; LOAD_SLOT x  ->  DUP; STORE_SLOT x
+                code[i] = ('DUP', None)
+                code[i+1] = (op, arg)
+                changed += 1
+                i += 2
+                continue
+        i += 1
+    return changed
+
+def optimize(code: List[Instr], line_info: List[int]) -> Tuple[List[Instr], List[int]]:
+    """Peephole-optimise a compiled program until nothing changes.
+
+    Threads jumps through other jumps, turns NOT + conditional jump into the
+    inverted jump, a store and reload of one slot into DUP + store, and drops jumps to
+    the next instruction and unreachable code. Jump targets and line_info
+    are rewritten to match.
+    """
+    code = list(code)
+    while True:
+        changed = thread_jumps(code)
+        keep = [True] * len(code)
+        changed += rewrite_pairs(code, keep)
+        for i, live in enumerate(reachable(code)):
+            if not live and keep[i]:
+                keep[i] = False
+                changed += 1
+        if not all(keep):
+            code, line_info = compact(code, line_info, keep)
+        if not changed:
+            return code, line_info
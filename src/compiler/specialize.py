@@ -0,0 +1,157 @@
+from src.compiler.bytecode import Instr, successors
+from typing import Dict, List, Optional, Tuple
+
+# Type specialisation: a forward dataflow pass over the bytecode works out
+# which operands are always ints, and a DIV that only ever sees ints becomes
+# IDIV, plain floor division without DIV's type check. A fused LOAD_CONST_OP
+# gets IDIV in its op field the same way. DIV is the only opcode with a
+# check to skip: the VM's other arithmetic and comparisons already run the
+# bare Python operator, so typed forms of them would not be any faster.
+#
+# A value is INT or ANY. Every slot starts at 0, constants from the lexer
+# are ints and comparisons give 1 or 0, so compiled programs are all INT;
+# ANY only comes from hand-built code with other constants. Slot types are
+# flow-insensitive: a slot is INT if every store to it is. Stack types are
+# tracked per instruction.
+#
+# Runs after the superinstructions pass, which only matches generic opcodes.
+
+INT = 'int'
+ANY = 'any'
+
+TYPED_OPCODES = {'DIV': 'IDIV'}
+GENERIC_OPCODES = {typed: op for op, typed in TYPED_OPCODES.items()}
+ARITHMETIC_OPS = frozenset(('ADD', 'SUB', 'MUL', 'DIV'))
+# Ops that always push 1 or 0
+BOOLEAN_OPS = frozenset(('EQ', 'NE', 'LT', 'LE', 'GT', 'GE', 'AND', 'OR'))
+
+def _const_type(value) -> str:
+    return INT if type(value) is int else ANY
+
+def _join(a: str, b: str) -> str:
+    return a if a == b else ANY
+
+class _Inference:
+    def __init__(self, code: List[Instr]):
+        self.code = code
+        self.slots: Dict[int, str] = {}
+        # Stack types on entry to each instruction, None if unreachable
+        self.stacks: List[Optional[Tuple[str, ...]]] = [None] * len(code)
+
+    def slot(self, slot: int) -> str:
+        # A slot never stored to holds its initial 0
+        return self.slots.get(slot, INT)
+
+    def store(self, slot: int, t: str) -> bool:
+        if t == INT or self.slot(slot) == ANY:
+            return False
+        self.slots[slot] = ANY
+        return True
+
+    def step(self, i: int, stack: List[str]) -> bool:
+        """Apply instruction i to stack; return whether a slot widened to ANY."""
+        op, arg = self.code[i]
+        op = GENERIC_OPCODES.get(op, op)
+        if op == 'CONST':
+            stack.append(_const_type(arg))
+        elif op == 'LOAD_SLOT':
+            stack.append(self.slot(arg))
+        elif op == 'STORE_SLOT':
+            return self.store(arg, stack.pop())
+        elif op in ARITHMETIC_OPS:
+            b, a = stack.pop(), stack.pop()
+            stack.append(INT if a == b == INT else ANY)
+        elif op in BOOLEAN_OPS:
+            del stack[-2:]
+            stack.append(INT)
+        elif op == 'NOT':
+            stack[-1] = INT
+        elif op == 'DUP':
+            stack.append(stack[-1])
+        elif op in ('PRINT', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE'):
+            stack.pop()
+        elif op == 'INC_VAR':
+            slot, delta = arg
+            return self.store(slot, _join(self.slot(slot), _const_type(delta)))
+        elif op == 'STORE_CONST':
+            slot, value = arg
+            return self.store(slot, _const_type(value))
+        elif op == 'LOAD_CONST_OP':
+            slot, value, fused = arg
+            fused = GENERIC_OPCODES.get(fused, fused)
+            if fused in BOOLEAN_OPS:
+                stack.append(INT)
+            else:
+                stack.append(_join(self.slot(slot), _const_type(value)))
+        elif op not in ('JUMP', 'HALT', 'COMPARE_JUMP', 'COMPARE_CONST_JUMP'):
+            raise ValueError(f'Unknown opcode {op}')
+        return False
+
+    def run(self):
+        # Rerun from scratch whenever a slot widens, since everything loaded
+        # from it before then was typed too narrowly; slots only widen once
+        while True:
+            self.stacks = [None] * len(self.code)
+            if self._flow():
+                return
+
+    def _flow(self) -> bool:
+        code = self.code
+        if code:
+            self.stacks[0] = ()
+        work = [0] if code else []
+        while work:
+            i = work.pop()
+            stack = list(self.stacks[i])
+            if self.step(i, stack):
+                return False
+            stack = tuple(stack)
+            for j in successors(code, i):
+                if j >= len(code):
+                    continue
+                old = self.stacks[j]
+                if old is None:
+                    self.stacks[j] = stack
+                elif old != stack:
+                    if len(old) != len(stack):
+                        raise ValueError(f'Stack depth differs at ip {j}')
+                    joined = tuple(_join(a, b) for a, b in zip(old, stack))
+                    if joined == old:
+                        continue
+                    self.stacks[j] = joined
+                else:
+                    continue
+                work.append(j)
+        return True
+
+def infer_types(code: List[Instr]) -> _Inference:
+    inference = _Inference(code)
+    inference.run()
+    return inference
+
+def _typed(instr: Instr, stack: Tuple[str, ...], inference: _Inference) -> Instr:
+    op, arg = instr
+    if op in TYPED_OPCODES and stack[-2:] == (INT, INT):
+        return (TYPED_OPCODES[op], arg)
+    if op == 'LOAD_CONST_OP':
+        slot, value, fused = arg
+        if fused in TYPED_OPCODES and inference.slot(slot) == _const_type(value) == INT:
+            return (op, (slot, value, TYPED_OPCODES[fused]))
+    return instr
+
+def specialize(code: List[Instr], line_info: List[int]) -> Tuple[List[Instr], List[int]]:
+    """Replace DIVs whose operands are always ints with IDIV.
+
+    Code the analysis cannot follow, such as a jump target reached with two
+    different stack depths, is returned unchanged.
+    """
+    try:
+        inference = infer_types(code)
+    except (ValueError, IndexError):
+        return code, line_info
+    result = []
+    for i, instr in enumerate(code):
+        if inference.stacks[i] is not None:
+            instr = _typed(instr, inference.stacks[i], inference)
+        result.append(instr)
+    return result, line_info
@@ -0,0 +1,78 @@
+from src.compiler.bytecode import Instr, compact, jump_targets
+from typing import List, Tuple
+
+# Superinstructions replace the hottest short sequences the compiler emits:
+#
+#   INC_VAR (x, k)                   LOAD_SLOT x; CONST k; ADD|SUB; STORE_SLOT x
+#   STORE_CONST (x, k)               CONST k; STORE_SLOT x
+#   LOAD_CONST_OP (x, k, op)         LOAD_SLOT x; CONST k; <binary op>
+#   COMPARE_JUMP (a, b, cmp, t)      LOAD_SLOT a; LOAD_SLOT b; <compare>; JUMP_IF_FALSE t
+#   COMPARE_CONST_JUMP (a, k, cmp, t)  LOAD_SLOT a; CONST k; <compare>; JUMP_IF_FALSE t
+#
+# x, a and b are variable slots, k a constant and t a jump target.
+#
+# The compare-and-branch forms also absorb JUMP_IF_TRUE by negating the
+# comparison, which is exact because all values are integers.
+
+COMPARE_OPS = frozenset(('EQ', 'NE', 'LT', 'LE', 'GT', 'GE'))
+NEGATED_COMPARE = {'EQ': 'NE', 'NE': 'EQ', 'LT': 'GE', 'GE': 'LT', 'GT': 'LE', 'LE': 'GT'}
+FUSIBLE_OPS = frozenset(('ADD', 'SUB', 'MUL', 'DIV')) | COMPARE_OPS
+
+def _match(code: List[Instr], i: int, targets: set) -> Tuple[int, List[Instr]]:
+    """Return (length, replacement) for a fusible sequence starting at i."""
+    n = len(code)
+    op, arg = code[i]
+    ops = [code[j][0] for j in range(i, min(i + 5, n))]
+    args = [code[j][1] for j in range(i, min(i + 5, n))]
+
+    def clear(length):
+        # No jump may land inside the fused sequence
+        return all(j not in targets for j in range(i + 1, i + length))
+
+    if op == 'LOAD_SLOT' and len(ops) >= 3 and ops[1] == 'CONST':
+        slot, k = arg, args[1]
+        if ops[2] in ('ADD', 'SUB') and len(ops) >= 4:
+            delta = k if ops[2] == 'ADD' else -k
+            if ops[3] == 'STORE_SLOT' and args[3] == slot and clear(4):
+                return 4, [('INC_VAR', (slot, delta))]
+            if (len(ops) >= 5 and ops[3] == 'DUP' and ops[4] == 'STORE_SLOT'
+                    and args[4] == slot and clear(5)):
+                return 5, [('INC_VAR', (slot, delta)), ('LOAD_SLOT', slot)]
+        if ops[2] in COMPARE_OPS and len(ops) >= 4 and ops[3] in ('JUMP_IF_FALSE', 'JUMP_IF_TRUE') and clear(4):
+            cmp = ops[2] if ops[3] == 'JUMP_IF_FALSE' else NEGATED_COMPARE[ops[2]]
+            return 4, [('COMPARE_CONST_JUMP', (slot, k, cmp, args[3]))]
+        if ops[2] in FUSIBLE_OPS and clear(3):
+            return 3, [('LOAD_CONST_OP', (slot, k, ops[2]))]
+    if (op == 'LOAD_SLOT' and len(ops) >= 4 and ops[1] == 'LOAD_SLOT' and ops[2] in COMPARE_OPS
+            and ops[3] in ('JUMP_IF_FALSE', 'JUMP_IF_TRUE') and clear(4)):
+        cmp = ops[2] if ops[3] == 'JUMP_IF_FALSE' else NEGATED_COMPARE[ops[2]]
+        return 4, [('COMPARE_JUMP', (arg, args[1], cmp, args[3]))]
+    if op == 'CONST' and len(ops) >= 2:
+        if ops[1] == 'STORE_SLOT' and clear(2):
+            return 2, [('STORE_CONST', (args[1], arg))]
+        if len(ops) >= 3 and ops[1] == 'DUP' and ops[2] == 'STORE_SLOT' and clear(3):
+            return 3, [('STORE_CONST', (args[2], arg)), ('CONST', arg)]
+    return 0, None
+
+def fuse(code: List[Instr], line_info: List[int]) -> Tuple[List[Instr], List[int]]:
+    """Replace common opcode sequences with superinstructions.
+
+    A replacement is written over the start of the sequence and the rest is
+    dropped, so jump targets and line_info are fixed up by compact().
+    """
+    code = list(code)
+    targets = jump_targets(code)
+    keep = [True] * len(code)
+    i = 0
+    while i < len(code):
+        length, replacement = _match(code, i, targets)
+        if not length:
+            i += 1
+            continue
+        for j in range(length):
+            if j < len(replacement):
+                code[i + j] = replacement[j]
+            else:
+                keep[i + j] = False
+        i += length
+    return compact(code, line_info, keep)
@@ -0,0 +1,349 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from src.lexer.lexer import Lexer
+from src.lexer.tokens import T_EOF
+from src.parser.parser import Parser
+from src.parser.ast_nodes import ASTNode, If
+from src.compiler.compiler import Compiler
+from src.compiler.bytecode import JUMP_OPS, jump_target, with_target
+from src.compiler.linetable import LineTable
+from src.compiler.passes import DEFAULT_OPT_LEVEL, PassManager
+from src.exceptions import OilSyntaxError
+from typing import Any, Dict, List, Optional, Tuple
+
+# Statements are kept in blocks of about this many, each with its own
+# source text; a block is cut up once it holds twice as many
+BLOCK_UNITS = 64
+
+@dataclass
+class Unit:
+    """A top-level statement together with its source span and compiled code."""
+    start: int                       # offset of the first token in its block's text
+    end: int                         # offset just past the closing ';' or '}'
+    line: int                        # line of the first token, counted from the block's first line
+    node: ASTNode
+    code: List[Tuple[str, Any]] = None   # compiled and optimised as if placed at index 0
+    jumps: List[int] = None          # indices in code holding jump targets
+    lines: List[int] = None          # source line of each instruction, counted from line
+
+@dataclass
+class Block:
+    """Consecutive units and the source text from the first of them up to
+    the next block, which always starts a line."""
+    text: str
+    units: List[Unit]
+    newlines: int = 0                # newlines in text
+
+class PrefixSums:
+    """Sums of the first i of a list of numbers, as a Fenwick tree: adding
+    to one number, summing a prefix and finding where a total is reached
+    each take O(log n)."""
+
+    def __init__(self, values: List[int]):
+        n = len(values)
+        self.tree = tree = [0] + values
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, i: int, delta: int):
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Sum of values[:i]."""
+        tree = self.tree
+        total = 0
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def count_within(self, total: int) -> int:
+        """The largest i with prefix(i) <= total."""
+        tree = self.tree
+        i = 0
+        step = self.top
+        while step:
+            if i + step < len(tree) and tree[i + step] <= total:
+                i += step
+                total -= tree[i]
+            step >>= 1
+        return i
+
+def _unit_end(unit: Unit) -> int:
+    return unit.end
+
+def _unit_start(unit: Unit) -> int:
+    return unit.start
+
+def _line_text(source: str, pos: int) -> str:
+    start = source.rfind('\n', 0, pos) + 1
+    end = source.find('\n', pos)
+    return source[start:end if end != -1 else len(source)]
+
+class IncrementalCompiler:
+    """Keeps a program's top-level statements between edits.
+
+    edit() re-lexes only the whole lines around the changed text, re-parses
+    the top-level statements that touch them and recompiles and optimises
+    just those statements; every other statement keeps its AST and
+    bytecode. The bytecode passes run on each statement's code as it is
+    compiled, so none of their rewrites spans two statements; a jump out of
+    a statement stays a jump to the start of the next one.
+
+    Statements are kept in blocks, with positions and lines relative to
+    their block, and the blocks' lengths in prefix sums, so an edit only
+    moves the statements after it in its own block. The program is linked
+    when program() asks for it.
+    """
+
+    def __init__(self, source: str = '', lexer: Optional[Lexer] = None,
+                 opt_level: int = DEFAULT_OPT_LEVEL):
+        self.lexer = lexer or Lexer()
+        self.passes = PassManager(opt_level)
+        self.set_source(source)
+
+    @property
+    def source(self) -> str:
+        return ''.join(block.text for block in self.blocks)
+
+    @property
+    def units(self) -> List[Unit]:
+        return [u for block in self.blocks for u in block.units]
+
+    @property
+    def nodes(self) -> List[ASTNode]:
+        return [u.node for u in self.units]
+
+    def set_source(self, source: str):
+        self.blocks = [Block('', [])]
+        self._index()
+        # Variable slots stay fixed across edits so unchanged statements keep
+        # their code; a name whose last use is edited away keeps its slot
+        self.slots: Dict[str, int] = {}
+        self.valid = True
+        # (characters re-lexed, statements re-parsed) by the last edit
+        self.last_edit = (0, 0)
+        self.edit(0, 0, source)
+
+    def edit(self, start: int, end: int, text: str):
+        """Replace source[start:end] with text and update the program."""
+        length = self.chars.prefix(len(self.blocks))
+        if not 0 <= start <= end <= length:
+            raise ValueError(f'Edit span {start}:{end} outside source of length {length}')
+        if self.valid:
+            k = self._block_at(start)
+            self._merge(k, self._block_at(end) + 1)
+        else:
+            # The previous edit left a syntax error behind; start over
+            k = 0
+            self._merge(0, len(self.blocks))
+
+        while True:
+            block = self.blocks[k]
+            units = block.units
+            old = block.text
+            base = self.chars.prefix(k)
+            s, e = start - base, end - base
+            if self.valid:
+                a = bisect_left(units, s, key=_unit_end)
+                b = bisect_right(units, e, key=_unit_start)
+                a, b, r0, r1 = self._cover(old, units, a, b, s, e)
+                # An if statement absorbs a following 'else', so an edit right
+                # after one has to re-parse it as well
+                if a == 0 and k > 0:
+                    prev = self.blocks[k-1].units
+                    if not prev or isinstance(prev[-1].node, If):
+                        self._merge(k - 1, k + 1)
+                        k -= 1
+                        continue
+                if a > 0 and isinstance(units[a-1].node, If):
+                    a, b, r0, r1 = self._cover(old, units, a - 1, b, units[a-1].start, r1)
+            else:
+                a, b, r0, r1 = 0, len(units), 0, len(old)
+            break
+
+        new = old[:s] + text + old[e:]
+        delta = len(text) - (e - s)
+        line_delta = text.count('\n') - old.count('\n', s, e)
+        first_line = self.newlines.prefix(k)
+        while True:
+            try:
+                new_units = self._parse_region(new, r0, r1 + delta, first_line)
+                break
+            except OilSyntaxError:
+                if b == len(units) and k + 1 == len(self.blocks):
+                    block.text = new
+                    block.newlines += line_delta
+                    self.chars.add(k, delta)
+                    self.newlines.add(k, line_delta)
+                    self.valid = False
+                    raise
+                # The edit may have opened a block that now runs on into the
+                # following statements; take in twice as many each retry
+                nb = b + max(1, b - a)
+                while nb > len(units) and k + 1 < len(self.blocks):
+                    self._merge(k, k + 2)
+                nb = min(nb, len(units))
+                old = block.text
+                new = old[:s] + text + old[e:]
+                a, b, r0, r1 = self._cover(old, units, a, nb, r0, units[nb-1].end if nb else r1)
+
+        for u in new_units:
+            comp = Compiler(self.passes, self.slots)
+            for stmt in self.passes.run_ast([u.node]):
+                comp.compile_node(stmt)
+            u.code, lines = self.passes.run_bytecode(comp.code, comp.line_info)
+            first = first_line + u.line
+            u.lines = [line - first for line in lines]
+            u.jumps = [i for i, (op, _) in enumerate(u.code) if op in JUMP_OPS]
+        # Only the statements after the edit in this block move
+        if delta or line_delta:
+            for u in units[b:]:
+                u.start += delta
+                u.end += delta
+                u.line += line_delta
+            self.chars.add(k, delta)
+            self.newlines.add(k, line_delta)
+        units[a:b] = new_units
+        block.text = new
+        block.newlines += line_delta
+        self.valid = True
+        self.last_edit = (r1 + delta - r0, len(new_units))
+        self._split(k)
+
+    def _cover(self, old: str, units: List[Unit], a: int, b: int, r0: int, r1: int):
+        # Grow [r0, r1) to whole lines, since no token or comment crosses a
+        # newline, and units[a:b] to every statement overlapping those lines
+        while True:
+            if a < b:
+                r0 = min(r0, units[a].start)
+                r1 = max(r1, units[b-1].end)
+            r0 = old.rfind('\n', 0, r0) + 1
+            nl = old.find('\n', r1)
+            r1 = nl if nl != -1 else len(old)
+            na = min(a, bisect_left(units, r0, key=_unit_end))
+            nb = max(b, bisect_right(units, r1, key=_unit_start))
+            if (na, nb) == (a, b):
+                return a, b, r0, r1
+            a, b = na, nb
+
+    def _index(self):
+        # Prefix sums over the blocks, rebuilt when they are merged or split
+        self.chars = PrefixSums([len(block.text) for block in self.blocks])
+        self.newlines = PrefixSums([block.newlines for block in self.blocks])
+
+    def _block_at(self, pos: int) -> int:
+        # The last block starting at or before pos
+        return min(self.chars.count_within(pos), len(self.blocks) - 1)
+
+    def _merge(self, i: int, j: int):
+        # Join blocks[i:j] into blocks[i]
+        if j - i < 2:
+            return
+        blocks = self.blocks
+        first = blocks[i]
+        texts = [first.text]
+        offset = len(first.text)
+        for block in blocks[i+1:j]:
+            for u in block.units:
+                u.start += offset
+                u.end += offset
+                u.line += first.newlines
+            first.units.extend(block.units)
+            texts.append(block.text)
+            offset += len(block.text)
+            first.newlines += block.newlines
+        first.text = ''.join(texts)
+        del blocks[i+1:j]
+        self._index()
+
+    def _split(self, k: int):
+        # Cut a block grown past twice BLOCK_UNITS into blocks of about
+        # BLOCK_UNITS, each starting on a line between two statements
+        block = self.blocks[k]
+        units = block.units
+        if len(units) <= 2 * BLOCK_UNITS:
+            return
+        text = block.text
+        cuts = [(0, 0)]
+        m = BLOCK_UNITS
+        while m <= len(units) - BLOCK_UNITS:
+            nl = text.rfind('\n', units[m-1].end, units[m].start)
+            if nl == -1:
+                m += 1
+                continue
+            cuts.append((m, nl + 1))
+            m += BLOCK_UNITS
+        if len(cuts) == 1:
+            return
+        cuts.append((len(units), len(text)))
+        blocks = []
+        lines = 0
+        for (m0, p0), (m1, p1) in zip(cuts, cuts[1:]):
+            part = units[m0:m1]
+            for u in part:
+                u.start -= p0
+                u.end -= p0
+                u.line -= lines
+            newlines = text.count('\n', p0, p1)
+            blocks.append(Block(text[p0:p1], part, newlines))
+            lines += newlines
+        self.blocks[k:k+1] = blocks
+        self._index()
+
+    def _parse_region(self, source: str, r0: int, r1: int, first_line: int) -> List[Unit]:
+        # Tokens get absolute lines, units lines counted from first_line
+        base_line = first_line + source.count('\n', 0, r0)
+        try:
+            tokens = self.lexer.lex(source[r0:r1])
+        except OilSyntaxError as e:
+            raise OilSyntaxError(e.message, e.line_num + base_line, e.source_line) from None
+        if not tokens:
+            return []
+        for tok in tokens:
+            tok.pos += r0
+            tok.line += base_line
+
+        parser = Parser(tokens)
+        cursor = parser.cursor
+        units = []
+        try:
+            while parser.kind() != T_EOF:
+                first = cursor.pos
+                node = parser.parse_stmt()
+                units.append(Unit(tokens[first].pos, tokens[cursor.pos-1].pos + 1,
+                                  tokens[first].line - first_line, node))
+        except OilSyntaxError as e:
+            tok = cursor.peek() or tokens[-1]
+            raise OilSyntaxError(e.message, e.line_num, _line_text(source, tok.pos)) from None
+        return units
+
+    def program(self) -> Tuple[List[Tuple[str, Any]], LineTable, List[str]]:
+        """The linked program, in the same form as Compiler.compile_program.
+
+        Linking places every statement's code, so it takes time in
+        proportion to the whole program, unlike edit().
+        """
+        code = []
+        line_info = []
+        first_line = 0
+        for block in self.blocks:
+            for u in block.units:
+                offset = len(code)
+                code += u.code
+                for j in u.jumps:
+                    op, arg = code[offset + j]
+                    code[offset + j] = with_target(op, arg, jump_target(op, arg) + offset)
+                first = first_line + u.line
+                line_info += [first + line for line in u.lines]
+            first_line += block.newlines
+        code.append(('HALT', None))
+        line_info.append(line_info[-1] if line_info else 0)
+        return code, LineTable.from_lines(line_info), list(self.slots)
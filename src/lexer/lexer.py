@@ -1,48 +1,74 @@
 import re
-from src.lexer.tokens import Token, TOKEN_SPEC
+from bisect import bisect_right
+from src.lexer.tokens import Token, TOKEN_SPEC, TOKEN_TYPES, TOKEN_CODES, T_NUMBER, T_MISMATCH
+from src.lexer.packed import PackedTokens
+from src.lexer.scanner import TableScanner
 from src.exceptions import OilSyntaxError
-from typing import List
+from typing import Any, Iterator, List, Tuple
+
+def line_starts(code: str) -> List[int]:
+    # Offset of the first character of every line, built in one pass
+    starts = [0]
+    pos = code.find('\n')
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = code.find('\n', pos + 1)
+    return starts
+
+def source_line(code: str, starts: List[int], line_num: int) -> str:
+    start = starts[line_num - 1]
+    end = starts[line_num] - 1 if line_num < len(starts) else len(code)
+    return code[start:end]
+
+LEXER_BACKENDS = ('regex', 'table')
 
 class Lexer:
-    def __init__(self):
+    def __init__(self, backend: str = 'regex'):
+        if backend not in LEXER_BACKENDS:
+            raise ValueError(f'Unknown lexer backend {backend!r}, expected one of {LEXER_BACKENDS}')
+        self.backend = backend
         self.master_re = re.compile('|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPEC))
-        
-    def lex(self, code: str) -> List[Token]:
-        lines = code.split('\n')
-        tokens = []
+        self.scan = self.scan_regex if backend == 'regex' else TableScanner().scan
+
+    def scan_regex(self, code: str) -> Iterator[Tuple[int, Any, int]]:
+        codes = TOKEN_CODES
         for m in self.master_re.finditer(code):
             typ = m.lastgroup
-            val = m.group()
-            start_pos = m.start()
-
-            # Calculate line number and source line
-            line_num = 1
-            current_pos = 0
-            source_line = ""
-            for i, line in enumerate(lines, 1):
-                line_length = len(line) + 1  # +1 for newline
-                if current_pos <= start_pos < current_pos + line_length:
-                    line_num = i
-                    source_line = line
-                    break
-                current_pos += line_length
-            
-            if typ == 'NUMBER':
-                tokens.append(Token('NUMBER', int(val)))
-            elif typ in ('ID', 'WHILE', 'IF', 'ELSE', 'PRINT'):
-                tokens.append(Token(typ, val))
-            elif typ == "COMPOUND_OP":
-                tokens.append(Token('COMPOUND_OP', val))
-            elif typ == 'OP':
-                tokens.append(Token('OP', val))
-            elif typ == 'LOGICAL_OP':
-                tokens.append(Token('LOGICAL_OP', val))
-            elif typ == 'NOT':
-                tokens.append(Token('NOT', val))
-            elif typ in ('LPAREN','RPAREN','LBRACE','RBRACE','SEMI'):
-                tokens.append(Token(typ, val))
-            elif typ == 'SKIP':
+            if typ == 'SKIP' or typ == 'COMMENT':
                 continue
+            if typ == 'NUMBER':
+                yield T_NUMBER, int(m.group()), m.start()
             elif typ == 'MISMATCH':
-                raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line)
-        return tokens
\ No newline at end of file
+                yield T_MISMATCH, m.group(), m.start()
+            else:
+                yield codes[typ], m.group(), m.start()
+
+    def lex(self, code: str) -> List[Token]:
+        starts = line_starts(code)
+        last_line = len(starts)
+        types = TOKEN_TYPES
+        tokens = []
+        line_num = 1
+        line_start = 0
+        next_start = starts[1] if last_line > 1 else len(code) + 1
+        for kind, val, start_pos in self.scan(code):
+            # Tokens arrive in source order, so the line only ever moves forward
+            while start_pos >= next_start:
+                line_num += 1
+                line_start = next_start
+                next_start = starts[line_num] if line_num < last_line else len(code) + 1
+            if kind == T_MISMATCH:
+                raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line(code, starts, line_num))
+            tokens.append(Token(types[kind], val, start_pos, line_num, start_pos - line_start + 1))
+        return tokens
+
+    def lex_packed(self, code: str) -> PackedTokens:
+        starts = line_starts(code)
+        packed = PackedTokens(starts)
+        append = packed.append
+        for kind, val, start_pos in self.scan(code):
+            if kind == T_MISMATCH:
+                line_num = bisect_right(starts, start_pos)
+                raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line(code, starts, line_num))
+            append(kind, val, start_pos)
+        return packed
@@ -0,0 +1,80 @@
+from array import array
+from bisect import bisect_right
+from src.lexer.tokens import Token, TOKEN_TYPES, T_EOF
+from typing import Any, List, Optional
+
+class PackedTokens:
+    """Token stream stored as parallel typed arrays instead of Token objects.
+
+    kinds holds the TOKEN_CODES code of each token, values an index into the
+    interned value table and offsets the start offset in the source. Line and
+    column are recovered from the line-start table only when they are needed.
+    """
+
+    def __init__(self, line_starts: List[int]):
+        self.kinds = array('B')
+        self.values = array('I')
+        self.offsets = array('I')
+        self.table: List[Any] = []
+        self._interned = {}
+        self.line_starts = array('I', line_starts)
+
+    def append(self, kind: int, value: Any, offset: int):
+        idx = self._interned.get(value)
+        if idx is None:
+            idx = self._interned[value] = len(self.table)
+            self.table.append(value)
+        self.kinds.append(kind)
+        self.values.append(idx)
+        self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def line_of(self, i: int) -> int:
+        return bisect_right(self.line_starts, self.offsets[i])
+
+    def token(self, i: int) -> Token:
+        offset = self.offsets[i]
+        line_num = bisect_right(self.line_starts, offset)
+        col = offset - self.line_starts[line_num - 1] + 1
+        return Token(TOKEN_TYPES[self.kinds[i]], self.table[self.values[i]], offset, line_num, col)
+
+    def __iter__(self):
+        for i in range(len(self.kinds)):
+            yield self.token(i)
+
+    def cursor(self) -> 'PackedCursor':
+        return PackedCursor(self)
+
+class PackedCursor:
+    """Parser cursor over PackedTokens; kinds are compared as plain ints."""
+
+    def __init__(self, packed: PackedTokens):
+        self.packed = packed
+        self._kinds = packed.kinds
+        self._values = packed.values
+        self._table = packed.table
+        self._end = len(packed.kinds)
+        self.pos = 0
+
+    def kind(self, k: int = 0) -> int:
+        i = self.pos + k
+        return self._kinds[i] if i < self._end else T_EOF
+
+    def value(self, k: int = 0) -> Any:
+        return self._table[self._values[self.pos + k]]
+
+    def line(self, k: int = 0) -> int:
+        if not self._end:
+            return 1
+        return self.packed.line_of(min(self.pos + k, self._end - 1))
+
+    def peek(self, k: int = 0) -> Optional[Token]:
+        i = self.pos + k
+        return self.packed.token(i) if i < self._end else None
+
+    def advance(self) -> Any:
+        value = self._table[self._values[self.pos]]
+        self.pos += 1
+        return value
@@ -0,0 +1,97 @@
+from src.lexer.tokens import (
+    T_MISMATCH, T_WHILE, T_IF, T_ELSE, T_PRINT, T_NUMBER, T_ID, T_COMPOUND_OP,
+    T_OP, T_LOGICAL_OP, T_NOT, T_LPAREN, T_RPAREN, T_LBRACE, T_RBRACE, T_SEMI,
+)
+from typing import Any, Iterator, Tuple
+
+# Character classes
+C_OTHER, C_SPACE, C_LETTER, C_DIGIT, C_PUNCT = range(5)
+
+SPACE_CHARS = ' \t\r\n'
+LETTER_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_'
+DIGIT_CHARS = '0123456789'
+PUNCT_CHARS = '+-*/%&|^=!<>(){};'
+
+CHAR_CLASS = {}
+for chars, cls in ((SPACE_CHARS, C_SPACE), (LETTER_CHARS, C_LETTER),
+                   (DIGIT_CHARS, C_DIGIT), (PUNCT_CHARS, C_PUNCT)):
+    for c in chars:
+        CHAR_CLASS[c] = cls
+
+IDENT_CHARS = frozenset(LETTER_CHARS + DIGIT_CHARS)
+SPACE_SET = frozenset(SPACE_CHARS)
+DIGIT_SET = frozenset(DIGIT_CHARS)
+
+KEYWORDS = {'while': T_WHILE, 'if': T_IF, 'else': T_ELSE, 'print': T_PRINT}
+
+# Two-character operators are tried before single characters; '//' starts a comment
+T_COMMENT = -3
+TWO_CHAR = {
+    '//': T_COMMENT,
+    '+=': T_COMPOUND_OP, '-=': T_COMPOUND_OP, '*=': T_COMPOUND_OP, '/=': T_COMPOUND_OP,
+    '%=': T_COMPOUND_OP, '&=': T_COMPOUND_OP, '|=': T_COMPOUND_OP, '^=': T_COMPOUND_OP,
+    '==': T_OP, '!=': T_OP, '<=': T_OP, '>=': T_OP, '=<': T_OP,
+    '&&': T_LOGICAL_OP, '||': T_LOGICAL_OP,
+}
+ONE_CHAR = {
+    '+': T_OP, '-': T_OP, '*': T_OP, '/': T_OP, '<': T_OP, '>': T_OP, '=': T_OP,
+    '!': T_NOT, '(': T_LPAREN, ')': T_RPAREN, '{': T_LBRACE, '}': T_RBRACE, ';': T_SEMI,
+}
+
+def _is_word(c: str) -> bool:
+    # Same notion of a word character as \b in the regex backend
+    return c in IDENT_CHARS or (c > '\x7f' and c.isalnum())
+
+def _is_digit(c: str) -> bool:
+    # \d matches any Unicode decimal digit
+    return c in DIGIT_SET or (c > '\x7f' and c.isdecimal())
+
+class TableScanner:
+    """Table-driven scanner producing the same tokens as the TOKEN_SPEC regex.
+
+    Each character is classified with one table lookup, identifiers are
+    matched first and then resolved to keywords with a single dict lookup.
+    """
+
+    def scan(self, code: str) -> Iterator[Tuple[int, Any, int]]:
+        classes = CHAR_CLASS
+        n = len(code)
+        i = 0
+        while i < n:
+            c = code[i]
+            cls = classes.get(c, C_OTHER)
+            if cls == C_SPACE:
+                i += 1
+                while i < n and code[i] in SPACE_SET:
+                    i += 1
+            elif cls == C_LETTER:
+                j = i + 1
+                while j < n and code[j] in IDENT_CHARS:
+                    j += 1
+                word = code[i:j]
+                kind = KEYWORDS.get(word, T_ID)
+                if kind != T_ID and ((i and _is_word(code[i-1])) or (j < n and _is_word(code[j]))):
+                    kind = T_ID
+                yield kind, word, i
+                i = j
+            elif cls == C_DIGIT or (cls == C_OTHER and _is_digit(c)):
+                j = i + 1
+                while j < n and _is_digit(code[j]):
+                    j += 1
+                yield T_NUMBER, int(code[i:j]), i
+                i = j
+            elif cls == C_PUNCT:
+                pair = code[i:i+2]
+                kind = TWO_CHAR.get(pair)
+                if kind == T_COMMENT:
+                    j = code.find('\n', i)
+                    i = j if j != -1 else n
+                elif kind is not None:
+                    yield kind, pair, i
+                    i += 2
+                else:
+                    yield ONE_CHAR.get(c, T_MISMATCH), c, i
+                    i += 1
+            else:
+                yield T_MISMATCH, c, i
+                i += 1
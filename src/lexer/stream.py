@@ -0,0 +1,79 @@
+import codecs
+import re
+from src.lexer.tokens import Token, TOKEN_SPEC
+from src.exceptions import OilSyntaxError
+from typing import Iterator
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+class StreamLexer:
+    """Lexes a file object or mmap buffer chunk by chunk, yielding tokens lazily.
+
+    Only the unread tail of the current chunk is kept in memory, so a whole
+    program never has to be materialised as one str or one token list.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.master_re = re.compile('|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPEC))
+        self.chunk_size = chunk_size
+
+    def lex(self, stream, encoding: str = 'utf-8') -> Iterator[Token]:
+        decoder = None
+        match = self.master_re.match
+        buf = ''
+        base = 0          # absolute offset of buf[0]
+        pos = 0           # read position inside buf
+        eof = False
+        line_num = 1
+        line_start = 0
+
+        while True:
+            if pos == len(buf):
+                if eof:
+                    return
+                m = None
+            else:
+                m = match(buf, pos)
+            # A match that runs into the end of the buffer may continue in the
+            # next chunk (identifiers, whitespace, comments, '<' vs '<='), so it
+            # is only trusted once the input is exhausted.
+            if m is None or (m.end() == len(buf) and not eof):
+                chunk = stream.read(self.chunk_size)
+                # EOF is an empty read; a byte chunk holding only part of a
+                # character decodes to '' without being the end
+                if not chunk:
+                    eof = True
+                if isinstance(chunk, bytes):
+                    if decoder is None:
+                        decoder = codecs.getincrementaldecoder(encoding)()
+                    chunk = decoder.decode(chunk, final=eof)
+                # Keep one character before pos so \b still sees the previous token
+                keep = pos - 1 if pos > 0 else 0
+                buf = buf[keep:] + chunk
+                base += keep
+                pos -= keep
+                continue
+
+            typ = m.lastgroup
+            val = m.group()
+            start_pos = base + pos
+            pos = m.end()
+
+            if typ == 'SKIP':
+                newlines = val.count('\n')
+                if newlines:
+                    line_num += newlines
+                    line_start = start_pos + val.rindex('\n') + 1
+                continue
+            if typ == 'COMMENT':
+                continue
+
+            col = start_pos - line_start + 1
+            if typ == 'NUMBER':
+                yield Token('NUMBER', int(val), start_pos, line_num, col)
+            elif typ == 'MISMATCH':
+                line_end = buf.find('\n', pos)
+                source_line = buf[max(line_start - base, 0):line_end if line_end != -1 else len(buf)]
+                raise OilSyntaxError(f'Unexpected character: {val!r}', line_num, source_line)
+            else:
+                yield Token(typ, val, start_pos, line_num, col)
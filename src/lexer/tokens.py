@@ -5,12 +5,16 @@ from typing import Any
 class Token:
     type: str
     value: Any
+    pos: int = 0
+    line: int = 0
+    col: int = 0
 
 TOKEN_SPEC = [
     ('WHILE',    r'\bwhile\b'),
     ('IF',       r'\bif\b'),
     ('ELSE',     r'\belse\b'),
     ('PRINT',    r'\bprint\b'),
+    ('COMMENT',  r'//[^\n]*'),
     ('NUMBER',   r'\d+'),
     ('ID',       r'[A-Za-z_][A-Za-z0-9_]*'),
     ('COMPOUND_OP', r'\+=|-=|\*=|/=|%=|&=|\|=|\^='),
@@ -24,4 +28,26 @@ TOKEN_SPEC = [
     ('SEMI',     r';'),
     ('SKIP',     r'[ \t\r\n]+'),
     ('MISMATCH', r'.'),
-]
\ No newline at end of file
+]
+
+# Integer codes for the token classes that reach the parser
+TOKEN_TYPES = [name for name, _ in TOKEN_SPEC if name not in ('COMMENT', 'SKIP', 'MISMATCH')]
+TOKEN_CODES = {name: code for code, name in enumerate(TOKEN_TYPES)}
+
+T_EOF = -1
+T_MISMATCH = -2
+T_WHILE = TOKEN_CODES['WHILE']
+T_IF = TOKEN_CODES['IF']
+T_ELSE = TOKEN_CODES['ELSE']
+T_PRINT = TOKEN_CODES['PRINT']
+T_NUMBER = TOKEN_CODES['NUMBER']
+T_ID = TOKEN_CODES['ID']
+T_COMPOUND_OP = TOKEN_CODES['COMPOUND_OP']
+T_OP = TOKEN_CODES['OP']
+T_LOGICAL_OP = TOKEN_CODES['LOGICAL_OP']
+T_NOT = TOKEN_CODES['NOT']
+T_LPAREN = TOKEN_CODES['LPAREN']
+T_RPAREN = TOKEN_CODES['RPAREN']
+T_LBRACE = TOKEN_CODES['LBRACE']
+T_RBRACE = TOKEN_CODES['RBRACE']
+T_SEMI = TOKEN_CODES['SEMI']
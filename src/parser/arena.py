@@ -0,0 +1,191 @@
+from array import array
+from src.parser.ast_nodes import *
+from typing import Any, Iterable, Iterator
+
+# Node kinds stored in NodeArena.kinds
+K_NUMBER, K_VAR, K_BINOP, K_UNOP, K_ASSIGN, K_COMPOUND, K_PRINT, K_WHILE, K_IF = range(9)
+NO_NODE = -1
+
+class NodeArena:
+    """Struct-of-arrays AST: one byte of kind plus three int fields and a
+    source line per node.
+
+    Field layout per kind (values are indices into the interned table,
+    children are node indices, blocks are indices into self.blocks where a
+    block is stored as its length followed by its statement indices):
+
+        K_NUMBER    a=value
+        K_VAR       a=name
+        K_BINOP     a=op    b=left     c=right
+        K_UNOP      a=op    b=expr
+        K_ASSIGN    a=name  b=expr
+        K_COMPOUND  a=name  b=op       c=expr
+        K_PRINT             b=expr
+        K_WHILE     a=cond  b=body
+        K_IF        a=cond  b=then     c=else or NO_NODE
+
+    Only statements have a line; it is 0 for expression nodes.
+    """
+
+    def __init__(self, nodes: Iterable[ASTNode] = ()):
+        self.kinds = array('B')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.lines = array('I')
+        self.blocks = array('i')
+        self.roots = array('i')
+        self.table = []
+        self._interned = {}
+        for node in nodes:
+            self.append(node)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _intern(self, value: Any) -> int:
+        idx = self._interned.get(value)
+        if idx is None:
+            idx = self._interned[value] = len(self.table)
+            self.table.append(value)
+        return idx
+
+    def _alloc(self) -> int:
+        self.kinds.append(0)
+        self.a.append(NO_NODE)
+        self.b.append(NO_NODE)
+        self.c.append(NO_NODE)
+        self.lines.append(0)
+        return len(self.kinds) - 1
+
+    def _block(self, stmts, stack) -> int:
+        start = len(self.blocks)
+        self.blocks.append(len(stmts))
+        for s in stmts:
+            idx = self._alloc()
+            self.blocks.append(idx)
+            stack.append((s, idx))
+        return start
+
+    def append(self, node: ASTNode) -> int:
+        """Pack a top-level statement and return its node index."""
+        root = self._alloc()
+        self.roots.append(root)
+        kinds, a, b, c, lines = self.kinds, self.a, self.b, self.c, self.lines
+        intern = self._intern
+        alloc = self._alloc
+        # Pre-order with an explicit stack: a node's slot is allocated by its
+        # parent and filled in when the node is popped
+        stack = [(node, root)]
+        while stack:
+            node, i = stack.pop()
+            if isinstance(node, Number):
+                kinds[i] = K_NUMBER
+                a[i] = intern(node.value)
+            elif isinstance(node, Var):
+                kinds[i] = K_VAR
+                a[i] = intern(node.name)
+            elif isinstance(node, BinOp):
+                kinds[i] = K_BINOP
+                a[i] = intern(node.op)
+                b[i] = alloc()
+                c[i] = alloc()
+                stack.append((node.right, c[i]))
+                stack.append((node.left, b[i]))
+            elif isinstance(node, UnOp):
+                kinds[i] = K_UNOP
+                a[i] = intern(node.op)
+                b[i] = alloc()
+                stack.append((node.expr, b[i]))
+            elif isinstance(node, Assign):
+                kinds[i] = K_ASSIGN
+                lines[i] = node.line
+                a[i] = intern(node.name)
+                b[i] = alloc()
+                stack.append((node.expr, b[i]))
+            elif isinstance(node, CompoundAssign):
+                kinds[i] = K_COMPOUND
+                lines[i] = node.line
+                a[i] = intern(node.name)
+                b[i] = intern(node.op)
+                c[i] = alloc()
+                stack.append((node.expr, c[i]))
+            elif isinstance(node, Print):
+                kinds[i] = K_PRINT
+                lines[i] = node.line
+                b[i] = alloc()
+                stack.append((node.expr, b[i]))
+            elif isinstance(node, While):
+                kinds[i] = K_WHILE
+                lines[i] = node.line
+                a[i] = alloc()
+                b[i] = self._block(node.body, stack)
+                stack.append((node.cond, a[i]))
+            elif isinstance(node, If):
+                kinds[i] = K_IF
+                lines[i] = node.line
+                a[i] = alloc()
+                b[i] = self._block(node.then_block, stack)
+                if node.else_block is not None:
+                    c[i] = self._block(node.else_block, stack)
+                stack.append((node.cond, a[i]))
+            else:
+                raise RuntimeError(f'Unknown AST node: {node}')
+        return root
+
+    def node(self, root: int) -> ASTNode:
+        """Materialise the tree rooted at node index root as AST objects."""
+        kinds, a, b, c, lines = self.kinds, self.a, self.b, self.c, self.lines
+        table = self.table
+        blocks = self.blocks
+        result = [None]
+        # (node index, container, key): the built node is stored as container[key]
+        # for lists and setattr(container, key, node) for parent nodes
+        stack = [(root, result, 0)]
+        while stack:
+            i, container, key = stack.pop()
+            kind = kinds[i]
+            if kind == K_NUMBER:
+                node = Number(table[a[i]])
+            elif kind == K_VAR:
+                node = Var(table[a[i]])
+            elif kind == K_BINOP:
+                node = BinOp(table[a[i]], None, None)
+                stack.append((b[i], node, 'left'))
+                stack.append((c[i], node, 'right'))
+            elif kind == K_UNOP:
+                node = UnOp(table[a[i]], None)
+                stack.append((b[i], node, 'expr'))
+            elif kind == K_ASSIGN:
+                node = Assign(table[a[i]], None, lines[i])
+                stack.append((b[i], node, 'expr'))
+            elif kind == K_COMPOUND:
+                node = CompoundAssign(table[a[i]], table[b[i]], None, lines[i])
+                stack.append((c[i], node, 'expr'))
+            elif kind == K_PRINT:
+                node = Print(None, lines[i])
+                stack.append((b[i], node, 'expr'))
+            elif kind == K_WHILE:
+                node = While(None, self._list(b[i], stack), lines[i])
+                stack.append((a[i], node, 'cond'))
+            else:
+                else_block = self._list(c[i], stack) if c[i] != NO_NODE else None
+                node = If(None, self._list(b[i], stack), else_block, lines[i])
+                stack.append((a[i], node, 'cond'))
+            if isinstance(key, int):
+                container[key] = node
+            else:
+                setattr(container, key, node)
+        return result[0]
+
+    def _list(self, start: int, stack) -> List[ASTNode]:
+        n = self.blocks[start]
+        stmts = [None] * n
+        for k in range(n):
+            stack.append((self.blocks[start + 1 + k], stmts, k))
+        return stmts
+
+    def statements(self) -> Iterator[ASTNode]:
+        """Yield the top-level statements one at a time."""
+        for root in self.roots:
+            yield self.node(root)
@@ -1,50 +1,60 @@
 from dataclasses import dataclass
 from typing import List, Optional
 
-@dataclass
+# Nodes use __slots__ so a large program does not pay for one __dict__ per
+# node; see arena.py for the flat, array-backed form of a whole tree.
+# Statements carry the source line they start on, 0 when unknown;
+# expressions are attributed to the line of their statement.
+
+@dataclass(slots=True)
 class ASTNode: pass
 
-@dataclass
+@dataclass(slots=True)
 class While(ASTNode):
     cond: ASTNode
     body: List[ASTNode]
+    line: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class Number(ASTNode): 
     value: int
 
-@dataclass
+@dataclass(slots=True)
 class Var(ASTNode): 
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class BinOp(ASTNode): 
     op: str
     left: ASTNode
     right: ASTNode
 
-@dataclass
+@dataclass(slots=True)
 class UnOp(ASTNode):
     op: str
     expr: ASTNode
 
-@dataclass
+@dataclass(slots=True)
 class Assign(ASTNode): 
     name: str
     expr: ASTNode
+    line: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class Print(ASTNode): 
     expr: ASTNode
+    line: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class If(ASTNode): 
     cond: ASTNode
     then_block: List[ASTNode]
     else_block: Optional[List[ASTNode]]=None
+    line: int = 0
     
-@dataclass
+@dataclass(slots=True)
 class CompoundAssign(ASTNode):
     name: str
     op: str
-    expr: ASTNode
\ No newline at end of file
+    expr: ASTNode
+    line: int = 0
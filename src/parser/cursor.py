@@ -0,0 +1,79 @@
+from collections import deque
+from src.lexer.tokens import Token, TOKEN_CODES, T_EOF
+from src.lexer.packed import PackedTokens
+from typing import Any, Iterable, List, Optional
+
+# All cursors share one interface: kind()/value()/line() look k tokens
+# ahead, peek() materialises a Token for messages and advance() steps over
+# the current token and returns its value.
+
+class TokenCursor:
+    """Cursor over a fully built token list."""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def kind(self, k: int = 0) -> int:
+        i = self.pos + k
+        return TOKEN_CODES[self.tokens[i].type] if i < len(self.tokens) else T_EOF
+
+    def value(self, k: int = 0) -> Any:
+        return self.tokens[self.pos + k].value
+
+    def line(self, k: int = 0) -> int:
+        if not self.tokens:
+            return 1
+        return self.tokens[min(self.pos + k, len(self.tokens) - 1)].line
+
+    def peek(self, k: int = 0) -> Optional[Token]:
+        i = self.pos + k
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def advance(self) -> Any:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok.value
+
+class TokenWindow:
+    """Cursor that pulls tokens lazily from an iterator through a small lookahead buffer."""
+
+    def __init__(self, tokens: Iterable[Token]):
+        self._next = iter(tokens).__next__
+        self._buf = deque()
+        self._last = None
+        self.pos = 0
+
+    def peek(self, k: int = 0) -> Optional[Token]:
+        buf = self._buf
+        while len(buf) <= k:
+            try:
+                buf.append(self._next())
+            except StopIteration:
+                return None
+        return buf[k]
+
+    def kind(self, k: int = 0) -> int:
+        tok = self.peek(k)
+        return TOKEN_CODES[tok.type] if tok is not None else T_EOF
+
+    def value(self, k: int = 0) -> Any:
+        return self.peek(k).value
+
+    def line(self, k: int = 0) -> int:
+        tok = self.peek(k) or self._last
+        return tok.line if tok is not None else 1
+
+    def advance(self) -> Any:
+        if not self._buf:
+            self.peek()
+        self.pos += 1
+        self._last = self._buf.popleft()
+        return self._last.value
+
+def make_cursor(tokens):
+    if isinstance(tokens, PackedTokens):
+        return tokens.cursor()
+    if isinstance(tokens, list):
+        return TokenCursor(tokens)
+    return TokenWindow(tokens)
@@ -1,192 +1,192 @@
 from src.parser.ast_nodes import *
-from src.lexer.tokens import Token
+from src.lexer.tokens import (
+    Token, TOKEN_TYPES, T_EOF, T_WHILE, T_IF, T_ELSE, T_PRINT, T_NUMBER, T_ID,
+    T_COMPOUND_OP, T_OP, T_LOGICAL_OP, T_NOT, T_LPAREN, T_RPAREN, T_LBRACE,
+    T_RBRACE, T_SEMI,
+)
+from src.parser.cursor import make_cursor
+from src.parser.arena import NodeArena
+from typing import Iterable
 from src.exceptions import OilSyntaxError
 
+# Binding powers of the expression operators. Operators on the same level
+# associate to the left; a new operator only needs an entry here.
+BINARY_POWER = {
+    '&&': 10, '||': 10,
+    '==': 20, '!=': 20, '<': 20, '<=': 20, '>': 20, '>=': 20,
+    '+': 30, '-': 30,
+    '*': 40, '/': 40,
+}
+PREFIX_POWER = {
+    '!': 50,
+}
+
 class Parser:
-    def __init__(self, tokens: List[Token], source_code: str): 
-        self.tokens = tokens
-        self.pos = 0
-        self.token_lines = {}
-        self.source_lines = source_code.split('\n')
-        for i, token in enumerate(tokens):
-            self.token_lines[i] = i
-    
-    def get_current_line(self):
-        if self.pos < len(self.tokens):
-            pass
-        return None
-    
+    def __init__(self, tokens: Iterable[Token], source_code: Optional[str] = None):
+        # tokens may be a list, PackedTokens or any iterator (e.g.
+        # StreamLexer.lex); the parser reads them through a cursor and never
+        # looks more than two tokens ahead
+        self.cursor = make_cursor(tokens)
+        self.kind = self.cursor.kind
+        self.value = self.cursor.value
+        self.peek = self.cursor.peek
+        self.source_lines = source_code.split('\n') if source_code is not None else []
+
     def get_line_num(self):
-        return self.token_lines.get(self.pos, 0)
-    
-    def peek(self): 
-        return self.tokens[self.pos] if self.pos<len(self.tokens) else None
-    
-    def consume(self, expected_type=None, expected_val=None):
-        tok = self.peek()
-        if tok is None: 
-            line_num = self.get_line_num()
-            source_line = self.source_lines[line_num-1] if line_num <= len(self.source_lines) else ""
-            raise OilSyntaxError('Unexpected end of input', line_num, source_line)
-        if expected_type and tok.type != expected_type: 
-            line_num = self.get_line_num()
-            source_line = self.source_lines[line_num-1] if line_num <= len(self.source_lines) else ""
-            raise OilSyntaxError(f'Expected {expected_type}, got {tok.type}', line_num, source_line)
-        if expected_val and tok.value != expected_val: 
-            line_num = self.get_line_num()
-            source_line = self.source_lines[line_num-1] if line_num <= len(self.source_lines) else ""
-            raise OilSyntaxError(f'Expected {expected_val}, got {tok.value}', line_num, source_line)
-        self.pos += 1
-        return tok
+        return self.cursor.line()
+
+    def get_source_line(self, line_num):
+        if 0 < line_num <= len(self.source_lines):
+            return self.source_lines[line_num-1]
+        return None
+
+    def error(self, message):
+        line_num = self.get_line_num()
+        return OilSyntaxError(message, line_num, self.get_source_line(line_num))
+
+    def consume(self, expected_kind=None, expected_val=None):
+        kind = self.kind()
+        if kind == T_EOF:
+            raise self.error('Unexpected end of input')
+        if expected_kind is not None and kind != expected_kind:
+            raise self.error(f'Expected {TOKEN_TYPES[expected_kind]}, got {TOKEN_TYPES[kind]}')
+        if expected_val and self.value() != expected_val:
+            raise self.error(f'Expected {expected_val}, got {self.value()}')
+        return self.cursor.advance()
 
     def parse(self) -> List[ASTNode]:
         stmts = []
-        while self.peek() is not None:
+        while self.kind() != T_EOF:
             stmts.append(self.parse_stmt())
         return stmts
 
+    def parse_arena(self) -> NodeArena:
+        # Each statement is packed as soon as it is parsed, so only one
+        # statement's node objects are alive at a time
+        arena = NodeArena()
+        while self.kind() != T_EOF:
+            arena.append(self.parse_stmt())
+        return arena
+
     def parse_stmt(self) -> ASTNode:
-        tok = self.peek()
-        if tok is None:
-            raise SyntaxError('Unexpected EOF')
+        # while/if blocks are tracked on an explicit stack of open statements,
+        # so nesting depth is bounded by memory, not the recursion limit
+        open_blocks = []
+        while True:
+            kind = self.kind()
+            if kind == T_RBRACE and open_blocks:
+                self.cursor.advance()
+                node, block = open_blocks.pop()
+                if isinstance(node, If) and block is node.then_block and self.kind() == T_ELSE:
+                    self.cursor.advance()
+                    self.consume(T_LBRACE)
+                    node.else_block = []
+                    open_blocks.append((node, node.else_block))
+                    continue
+                stmt = node
+            elif kind == T_WHILE or kind == T_IF:
+                line = self.get_line_num()
+                self.cursor.advance()
+                self.consume(T_LPAREN)
+                cond = self.parse_expr()
+                self.consume(T_RPAREN)
+                self.consume(T_LBRACE)
+                node = While(cond, [], line) if kind == T_WHILE else If(cond, [], line=line)
+                open_blocks.append((node, node.body if kind == T_WHILE else node.then_block))
+                continue
+            else:
+                stmt = self.parse_simple_stmt()
+            if not open_blocks:
+                return stmt
+            open_blocks[-1][1].append(stmt)
 
-        if tok.type == 'WHILE':
-            return self.parse_while()
-        elif tok.type == 'PRINT':
-            self.consume('PRINT')
+    def parse_simple_stmt(self) -> ASTNode:
+        kind = self.kind()
+        line = self.get_line_num()
+        if kind == T_PRINT:
+            self.consume(T_PRINT)
             expr = self.parse_expr()
-            self.consume('SEMI')
-            return Print(expr)
-        elif tok.type == 'IF':
-            return self.parse_if()
-        elif tok.type == 'ID':
-            next_tok = self.tokens[self.pos+1] if self.pos+1 < len(self.tokens) else None
-            if next_tok and next_tok.type == 'OP' and next_tok.value == '=':
-                name = self.consume('ID').value
-                self.consume('OP', '=')
+            self.consume(T_SEMI)
+            return Print(expr, line)
+        elif kind == T_ID:
+            next_kind = self.kind(1)
+            if next_kind == T_OP and self.value(1) == '=':
+                name = self.consume(T_ID)
+                self.consume(T_OP, '=')
                 expr = self.parse_expr()
-                self.consume('SEMI')
-                return Assign(name, expr)
-            elif next_tok and next_tok.type == 'COMPOUND_OP':
-                name = self.consume('ID').value
-                compound_op = self.consume('COMPOUND_OP').value
+                self.consume(T_SEMI)
+                return Assign(name, expr, line)
+            elif next_kind == T_COMPOUND_OP:
+                name = self.consume(T_ID)
+                compound_op = self.consume(T_COMPOUND_OP)
                 expr = self.parse_expr()
-                self.consume('SEMI')
-                return CompoundAssign(name, compound_op, expr)
+                self.consume(T_SEMI)
+                return CompoundAssign(name, compound_op, expr, line)
             else:
-                line_num = self.get_line_num()
-                source_line = self.source_lines[line_num-1] if line_num <= len(self.source_lines) else ""
-                raise OilSyntaxError(f'Unexpected identifier {tok.value}, expected assignment', line_num, source_line)
+                raise self.error(f'Unexpected identifier {self.value()}, expected assignment')
+        elif kind == T_EOF:
+            raise self.error('Unexpected end of input')
         else:
-            line_num = self.get_line_num()
-            source_line = self.source_lines[line_num-1] if line_num <= len(self.source_lines) else ""
-            raise OilSyntaxError(f'Unexpected token {tok}', line_num, source_line)
-
-    def parse_if(self) -> If:
-        self.consume('IF')
-        self.consume('LPAREN')
-        cond = self.parse_expr()
-        self.consume('RPAREN')
-        self.consume('LBRACE')
-        then_block = []
-        while self.peek() and self.peek().type != 'RBRACE':
-            then_block.append(self.parse_stmt())
-        self.consume('RBRACE')
-        else_block = None
-        if self.peek() and self.peek().type == 'ELSE':
-            self.consume('ELSE')
-            self.consume('LBRACE')
-            else_block = []
-            while self.peek() and self.peek().type != 'RBRACE':
-                else_block.append(self.parse_stmt())
-            self.consume('RBRACE')
-        return If(cond, then_block, else_block)
+            raise self.error(f'Unexpected token {self.peek()}')
 
-    # Expression parsing with precedence
-    def parse_expr(self) -> ASTNode: 
-        return self.parse_comparison()
-    
-    def parse_while(self) -> While:
-        self.consume('WHILE')
-        self.consume('LPAREN')
-        cond = self.parse_expr()
-        self.consume('RPAREN')
-        self.consume('LBRACE')
-        body = []
-        while self.peek() and self.peek().type != 'RBRACE':
-            body.append(self.parse_stmt())
-        self.consume('RBRACE')
-        return While(cond, body)
-    
+    # Expression parsing with precedence: operator precedence parsing driven
+    # by the binding powers in BINARY_POWER / PREFIX_POWER. Operands and
+    # pending operators live on explicit stacks instead of the call stack.
     def parse_expr(self) -> ASTNode:
-        return self.parse_logic()
-        
-    def parse_logic(self) -> ASTNode:
-        node = self.parse_comparison()
+        kind = self.kind
+        value = self.value
+        advance = self.cursor.advance
+        operands = []
+        ops = []          # (power, op, is_prefix); op is None for an open parenthesis
+        depth = 0
         while True:
-            tok = self.peek()
-            if tok and tok.type == 'LOGICAL_OP' and tok.value in ('&&', '||'):
-                op = self.consume('LOGICAL_OP').value
-                right = self.parse_comparison()
-                node = BinOp(op, node, right)
-            else: 
-                break
-        return node
-    
-    def parse_comparison(self) -> ASTNode:
-        node = self.parse_sum()
-        while True:
-            tok = self.peek()
-            if tok and tok.type == 'OP' and tok.value in ('==','!=','<','<=','>','>='):
-                op = self.consume('OP').value
-                right = self.parse_sum()
-                node = BinOp(op, node, right)
-            else: 
-                break
-        return node
-        
-    def parse_sum(self) -> ASTNode:
-        node = self.parse_term()
-        while True:
-            tok = self.peek()
-            if tok and tok.type == 'OP' and tok.value in ('+','-'):
-                op = self.consume('OP').value
-                right = self.parse_term()
-                node = BinOp(op, node, right)
-            else: 
-                break
-        return node
-        
-    def parse_term(self) -> ASTNode:
-        node = self.parse_factor()
-        while True:
-            tok = self.peek()
-            if tok and tok.type == 'OP' and tok.value in ('*','/'):
-                op = self.consume('OP').value
-                right = self.parse_factor()
-                node = BinOp(op, node, right)
-            else: 
+            # Prefix position: any number of '!' and '(' before an operand
+            k = kind()
+            while k == T_NOT or k == T_LPAREN:
+                if k == T_NOT:
+                    op = advance()
+                    ops.append((PREFIX_POWER[op], op, True))
+                else:
+                    advance()
+                    ops.append((0, None, False))
+                    depth += 1
+                k = kind()
+            if k == T_NUMBER:
+                operands.append(Number(advance()))
+            elif k == T_ID:
+                operands.append(Var(advance()))
+            elif k == T_EOF:
+                raise self.error('Unexpected end of input in expression')
+            else:
+                raise self.error(f'Unexpected token in expression: {self.peek()}')
+
+            # Infix position: close parentheses, then either a binary
+            # operator or the end of the expression
+            while True:
+                k = kind()
+                power = BINARY_POWER.get(value()) if k == T_OP or k == T_LOGICAL_OP else None
+                if power is None and k == T_RPAREN and depth:
+                    advance()
+                    depth -= 1
+                    while ops[-1][1] is not None:
+                        self._reduce(ops.pop(), operands)
+                    ops.pop()
+                    continue
+                # Operators on the same level associate to the left
+                min_power = power if power is not None else 1
+                while ops and ops[-1][0] >= min_power:
+                    self._reduce(ops.pop(), operands)
+                if power is None:
+                    if depth:
+                        self.consume(T_RPAREN)
+                    return operands[0]
+                ops.append((power, advance(), False))
                 break
-        return node
-        
-    def parse_factor(self) -> ASTNode:
-        tok = self.peek()
-        if tok is None: 
-            raise SyntaxError('Unexpected EOF in factor')
-        if tok.type == 'NOT':
-            self.consume('NOT')
-            expr = self.parse_factor()
-            return UnOp('!', expr)
-        if tok.type == 'NUMBER': 
-            val = self.consume('NUMBER').value
-            return Number(val)
-        elif tok.type == 'ID': 
-            name = self.consume('ID').value
-            return Var(name)
-        elif tok.type == 'LPAREN': 
-            self.consume('LPAREN')
-            node = self.parse_expr()
-            self.consume('RPAREN')
-            return node
-        else: 
-            raise SyntaxError(f'Line {self.get_line_num()}: Unexpected token in factor: {tok}')
\ No newline at end of file
+
+    def _reduce(self, entry, operands):
+        power, op, is_prefix = entry
+        if is_prefix:
+            operands[-1] = UnOp(op, operands[-1])
+        else:
+            right = operands.pop()
+            operands[-1] = BinOp(op, operands[-1], right)
@@ -1,9 +1,10 @@
-import re
 from src.utils.global_vars import version
 from src.utils.helpers import run_source
-from src.exceptions import OilSyntaxError
+from src.compiler.passes import PassManager
+from src.exceptions import OilRuntimeError, OilSyntaxError
+from typing import Optional
 
-def repl():
+def repl(passes: Optional[PassManager] = None, backend: str = 'vm'):
     print(f"OilLang {version} Type 'exit' to exit.")
     while True:
         try:
@@ -13,12 +14,9 @@ def repl():
             if not source.strip():
                 continue
             
-            # Remove comments
-            source_no_comments = re.sub(r'//.*', '', source)
-            
             try:
-                code, output = run_source(source_no_comments)
-            except OilSyntaxError as e:
+                code, output = run_source(source, passes=passes, backend=backend)
+            except (OilSyntaxError, OilRuntimeError) as e:
                 print(f"Error: {e}")
             except Exception as e:
                 print(f"Error during execution: {e}")
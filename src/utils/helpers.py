@@ -1,31 +1,198 @@
+import linecache
+import mmap
 from src.lexer.lexer import Lexer
+from src.lexer.stream import StreamLexer
 from src.parser.parser import Parser
+from src.parser.ast_nodes import ASTNode
 from src.compiler.compiler import Compiler
-from src.exceptions import OilSyntaxError
+from src.compiler.codeobject import CodeObject
+from src.compiler.linetable import LineTable
+from src.compiler.cache import BytecodeCache
+from src.compiler.passes import DEFAULT_OPT_LEVEL, PassManager
+from src.exceptions import OilRuntimeError, OilSyntaxError
 from src.vm.vm import VM
-from typing import List, Tuple, Any
+from src.vm.closures import ClosureProgram
+from src.vm.transpile import PythonProgram
+from src.vm.register import RegisterVM
+from src.vm.output import OutputSink
+from typing import List, Optional, Tuple, Any, Union
 
-def compile_source(source: str) -> List[Tuple[str, Any]]:
+# Ways to run a program: the bytecode VM, the AST compiled to closures, the
+# AST lowered to a Python function and compiled by CPython, or the AST
+# lowered to register code
+BACKENDS = ('vm', 'closure', 'python', 'register')
+
+# Compiled Python code objects by (source, AST passes), so running the same
+# source again (in the REPL, say) skips parsing and compile()
+PYTHON_CODE_CACHE_SIZE = 64
+_python_code_cache = {}
+
+def parse_source(source: str, passes: PassManager) -> List[ASTNode]:
+    """Lex and parse source and run the AST passes of passes over it."""
     try:
         lexer = Lexer()
-        tokens = lexer.lex(source)
+        tokens = lexer.lex_packed(source)
         parser = Parser(tokens, source)
-        
-        ast = parser.parse()
-        comp = Compiler()
-        
+
+        return passes.run_ast(parser.parse())
+    except OilSyntaxError:
+        raise
+    except Exception as e:
+        raise OilSyntaxError(str(e)) from e
+
+def parse_stream(stream, passes: PassManager) -> List[ASTNode]:
+    # Tokens are produced lazily from the stream and consumed by the parser
+    # as they arrive, so no full token list is ever built
+    try:
+        lexer = StreamLexer()
+        parser = Parser(lexer.lex(stream))
+
+        return passes.run_ast(parser.parse())
+    except OilSyntaxError:
+        raise
+    except Exception as e:
+        raise OilSyntaxError(str(e)) from e
+
+def parse_file(path: str, passes: PassManager) -> List[ASTNode]:
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return parse_stream(f, passes)
+        with buf:
+            return parse_stream(buf, passes)
+
+def compile_ast(ast: List[ASTNode], passes: PassManager) -> List[Tuple[str, Any]]:
+    try:
+        comp = Compiler(passes)
         return comp.compile_program(ast)
     except OilSyntaxError:
         raise
     except Exception as e:
         raise OilSyntaxError(str(e)) from e
 
-def run_source(source: str):
-    code, line_info = compile_source(source)
+def compile_source(source: str, opt_level: int = DEFAULT_OPT_LEVEL,
+                   passes: Optional[PassManager] = None) -> List[Tuple[str, Any]]:
+    # Pass a PassManager to read its per-pass stats afterwards; it overrides opt_level
+    passes = passes or PassManager(opt_level)
+    return compile_ast(parse_source(source, passes), passes)
+
+def compile_stream(stream, opt_level: int = DEFAULT_OPT_LEVEL,
+                   passes: Optional[PassManager] = None) -> List[Tuple[str, Any]]:
+    passes = passes or PassManager(opt_level)
+    return compile_ast(parse_stream(stream, passes), passes)
+
+def compile_file(path: str, opt_level: int = DEFAULT_OPT_LEVEL,
+                 passes: Optional[PassManager] = None) -> List[Tuple[str, Any]]:
+    passes = passes or PassManager(opt_level)
+    return compile_ast(parse_file(path, passes), passes)
+
+def compile_file_cached(path: str, passes: PassManager, cache: BytecodeCache):
+    """compile_file through cache: a program compiled before with the same
+    passes is loaded as it is, skipping lexing, parsing and compiling.
+
+    The key is hashed from the file in chunks and a miss is compiled from
+    the stream, so the source is never held in memory whole. The code comes
+    back packed, as a CodeObject with its line table.
+    """
+    with open(path, 'rb') as f:
+        key = cache.stream_key(f, passes.ast_passes + passes.bytecode_passes)
+    code = cache.load(key)
+    if code is None:
+        code, line_info, names = compile_ast(parse_file(path, passes), passes)
+        code = CodeObject.pack(code, names, line_info)
+        cache.store(key, code)
+    return code, code.lines, code.names
+
+def run_code(code: Union[CodeObject, List[Tuple[str, Any]]], names: List[str],
+             lines: Optional[LineTable] = None, output: Optional[OutputSink] = None):
+    vm = VM(code, names, lines, output)
     print('=== Bytecode ===')
-    for idx, instr in enumerate(code):
-        print(f'{idx:03}: {instr}')
+    print(vm.code.disassemble())
     print('=== Running VM ===')
-    vm = VM(code)
     vm.run()
-    return code, vm.output_lines
\ No newline at end of file
+    return code, vm.output_lines
+
+def run_closures(ast: List[ASTNode], output: Optional[OutputSink] = None):
+    print('=== Running closures ===')
+    program = ClosureProgram(ast, output)
+    program.run()
+    return program, program.output_lines
+
+def run_registers(ast: List[ASTNode], output: Optional[OutputSink] = None):
+    vm = RegisterVM.from_ast(ast, output)
+    print('=== Register code ===')
+    for idx, instr in enumerate(vm.code):
+        print(f'{idx:03}: {instr}')
+    print('=== Running register VM ===')
+    vm.run()
+    return vm.code, vm.output_lines
+
+def python_program(source: str, passes: PassManager,
+                   output: Optional[OutputSink] = None) -> PythonProgram:
+    key = (source, tuple(passes.ast_passes))
+    cached = _python_code_cache.get(key)
+    if cached is None:
+        program = PythonProgram.from_ast(parse_source(source, passes))
+        if len(_python_code_cache) >= PYTHON_CODE_CACHE_SIZE:
+            # Drop the oldest entry
+            del _python_code_cache[next(iter(_python_code_cache))]
+        _python_code_cache[key] = cached = (program.code, program.names)
+    return PythonProgram(*cached, output)
+
+def run_python(program: PythonProgram):
+    print('=== Running Python ===')
+    program.run()
+    return program, program.output_lines
+
+def _run(ast: List[ASTNode], passes: PassManager, backend: str, output: Optional[OutputSink]):
+    if backend == 'closure':
+        return run_closures(ast, output)
+    if backend == 'python':
+        return run_python(PythonProgram.from_ast(ast, output))
+    if backend == 'register':
+        return run_registers(ast, output)
+    if backend == 'vm':
+        code, line_info, names = compile_ast(ast, passes)
+        return run_code(code, names, line_info, output)
+    raise ValueError(f'Unknown backend {backend!r}; expected one of {", ".join(BACKENDS)}')
+
+def _with_source_line(e: Union[OilRuntimeError, OilSyntaxError],
+                      source_line: Optional[str]) -> Union[OilRuntimeError, OilSyntaxError]:
+    # The VM, and the parser reading a stream, only know the line number of
+    # an error (the stream lexer at most the part of the line in its chunk);
+    # the text of the line is added here
+    if e.line_num is None or not source_line:
+        return e
+    return type(e)(e.message, e.line_num, source_line)
+
+def run_source(source: str, opt_level: int = DEFAULT_OPT_LEVEL,
+               passes: Optional[PassManager] = None, backend: str = 'vm',
+               output: Optional[OutputSink] = None):
+    # output is where the program's printed lines go, buffered standard
+    # output by default; the lines returned are those the sink keeps
+    passes = passes or PassManager(opt_level)
+    try:
+        if backend == 'python':
+            return run_python(python_program(source, passes, output))
+        return _run(parse_source(source, passes), passes, backend, output)
+    except OilRuntimeError as e:
+        line = source.split('\n')[e.line_num - 1] if e.line_num else None
+        raise _with_source_line(e, line) from e.__cause__
+
+def run_file(path: str, opt_level: int = DEFAULT_OPT_LEVEL,
+             passes: Optional[PassManager] = None, backend: str = 'vm',
+             cache: Optional[BytecodeCache] = None, output: Optional[OutputSink] = None):
+    # cache is only used by the bytecode VM, the one backend that does not
+    # start from the AST
+    passes = passes or PassManager(opt_level)
+    try:
+        if backend == 'vm' and cache is not None:
+            code, line_info, names = compile_file_cached(path, passes, cache)
+            return run_code(code, names, output=output)
+        return _run(parse_file(path, passes), passes, backend, output)
+    except (OilRuntimeError, OilSyntaxError) as e:
+        # The file is only read again, for the one line, when there is an error
+        line = linecache.getline(path, e.line_num).rstrip('\n') if e.line_num else None
+        raise _with_source_line(e, line) from e.__cause__
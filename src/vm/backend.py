@@ -0,0 +1,27 @@
+from src.compiler.loops import TEMP_PREFIX
+from src.vm.output import OutputSink
+from typing import Any, Dict, List, Sequence
+
+class Backend:
+    """Base of the backends: the variables and printed lines of a run.
+
+    A backend sets names, slots (the value of names[i] is slots[i]) and
+    output.
+    """
+
+    names: Sequence[str]
+    slots: List[Any]
+    output: OutputSink
+
+    @property
+    def env(self) -> Dict[str, Any]:
+        """Name -> value view of the variables, unset ones reading as 0.
+
+        Compiler temporaries are left out.
+        """
+        return {name: value for name, value in zip(self.names, self.slots)
+                if not name.startswith(TEMP_PREFIX)}
+
+    @property
+    def output_lines(self) -> List[str]:
+        return self.output.lines
@@ -0,0 +1,267 @@
+import operator
+import sys
+from src.parser.ast_nodes import *
+from src.exceptions import OilRuntimeError
+from src.vm.backend import Backend
+from src.vm.output import OutputSink, StdoutSink
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Closure backend: every AST node becomes one Python closure taking the list
+# of variable slots, specialised when it is built for its operator and for
+# operands that are plain variables or constants. Running a program is then
+# a chain of direct calls, with no opcode decoding.
+#
+# Values are always ints, so '/' is floor division as in VM.run.
+#
+# An error in a statement is raised as OilRuntimeError with the line of the
+# statement, by whatever runs it: the loop over a block, a while or if
+# around a body of one statement, or run() itself. The try blocks doing so
+# cost nothing until something is raised.
+
+ARITHMETIC_FUNCS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv,
+}
+COMPARE_FUNCS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+COMPOUND_FUNCS = {
+    '+=': operator.add, '-=': operator.sub, '*=': operator.mul, '/=': operator.floordiv,
+}
+
+# Nested nodes run as nested Python calls, at most two per level counting
+# the loop over a block, and these have to stay this far below the
+# recursion limit
+RECURSION_HEADROOM = 100
+
+# An operand is ('slot', index), ('const', value) or ('call', closure);
+# slots and constants are read inline rather than through another call
+Operand = Tuple[str, Any]
+
+def _arithmetic(fn, left: Operand, right: Operand) -> Callable:
+    (lk, l), (rk, r) = left, right
+    if lk == 'slot':
+        if rk == 'const':
+            return lambda s: fn(s[l], r)
+        if rk == 'slot':
+            return lambda s: fn(s[l], s[r])
+        return lambda s: fn(s[l], r(s))
+    if lk == 'const':
+        if rk == 'const':
+            return lambda s: fn(l, r)
+        if rk == 'slot':
+            return lambda s: fn(l, s[r])
+        return lambda s: fn(l, r(s))
+    if rk == 'const':
+        return lambda s: fn(l(s), r)
+    if rk == 'slot':
+        return lambda s: fn(l(s), s[r])
+    return lambda s: fn(l(s), r(s))
+
+def _compare(fn, left: Operand, right: Operand) -> Callable:
+    # As _arithmetic, with the result normalised to 1 or 0
+    (lk, l), (rk, r) = left, right
+    if lk == 'slot':
+        if rk == 'const':
+            return lambda s: 1 if fn(s[l], r) else 0
+        if rk == 'slot':
+            return lambda s: 1 if fn(s[l], s[r]) else 0
+        return lambda s: 1 if fn(s[l], r(s)) else 0
+    if lk == 'const':
+        if rk == 'const':
+            return lambda s: 1 if fn(l, r) else 0
+        if rk == 'slot':
+            return lambda s: 1 if fn(l, s[r]) else 0
+        return lambda s: 1 if fn(l, r(s)) else 0
+    if rk == 'const':
+        return lambda s: 1 if fn(l(s), r) else 0
+    if rk == 'slot':
+        return lambda s: 1 if fn(l(s), s[r]) else 0
+    return lambda s: 1 if fn(l(s), r(s)) else 0
+
+def _runtime_error(e: Exception, line: int) -> OilRuntimeError:
+    # Errors from a nested statement already carry their line
+    if isinstance(e, OilRuntimeError):
+        return e
+    error = OilRuntimeError(str(e), line or None)
+    error.__cause__ = e
+    return error
+
+def _body_line(nodes: List[ASTNode]) -> int:
+    # Line to report for an error escaping _block(nodes): a block of several
+    # statements reports its own, a single statement runs unwrapped
+    return nodes[0].line if len(nodes) == 1 else 0
+
+def _block(stmts: List[Callable], nodes: List[ASTNode]) -> Optional[Callable]:
+    if not stmts:
+        return None
+    if len(stmts) == 1:
+        return stmts[0]
+    stmts = tuple(stmts)
+    def block(s):
+        try:
+            for stmt in stmts:
+                stmt(s)
+        except Exception as e:
+            raise _runtime_error(e, nodes[stmts.index(stmt)].line)
+    return block
+
+def _children(node: ASTNode) -> List[ASTNode]:
+    if isinstance(node, BinOp):
+        return [node.left, node.right]
+    if isinstance(node, (UnOp, Assign, CompoundAssign, Print)):
+        return [node.expr]
+    if isinstance(node, While):
+        return [node.cond, *node.body]
+    if isinstance(node, If):
+        return [node.cond, *node.then_block, *(node.else_block or ())]
+    return []
+
+class ClosureProgram(Backend):
+    """A program compiled to closures, with the same run()/env/output_lines
+    interface as VM."""
+
+    def __init__(self, nodes: List[ASTNode], output: Optional[OutputSink] = None):
+        self.slots_by_name: Dict[str, int] = {}
+        self.output = output if output is not None else StdoutSink()
+        self.body, self.depth = self._build(nodes)
+        self.line = _body_line(nodes)
+        self.names = list(self.slots_by_name)
+        self.slots = [0] * len(self.names)
+
+    def run(self):
+        if 2 * self.depth + RECURSION_HEADROOM > sys.getrecursionlimit():
+            raise RuntimeError(f'Program nests {self.depth} levels deep, too deep for '
+                               f'the closure backend; use the bytecode VM')
+        if self.body is not None:
+            try:
+                self.body(self.slots)
+            except Exception as e:
+                raise _runtime_error(e, self.line)
+            finally:
+                self.output.flush()
+
+    def _slot(self, name: str) -> int:
+        idx = self.slots_by_name.get(name)
+        if idx is None:
+            idx = self.slots_by_name[name] = len(self.slots_by_name)
+        return idx
+
+    def _build(self, nodes: List[ASTNode]):
+        # Post-order with an explicit stack, as in fold_expr; results holds
+        # (closure, nesting depth) for each finished node
+        results = []
+        stack = [(node, False) for node in reversed(nodes)]
+        while stack:
+            node, children_done = stack.pop()
+            children = _children(node)
+            if not children_done and children:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+            kids = results[len(results) - len(children):]
+            del results[len(results) - len(children):]
+            depth = max((d for _, d in kids), default=0) + 1
+            results.append((self._closure(node, [f for f, _ in kids]), depth))
+        body = _block([f for f, _ in results], nodes)
+        return body, max((d for _, d in results), default=0) + 1
+
+    def _operand(self, node: ASTNode, fn: Callable) -> Operand:
+        if isinstance(node, Var):
+            return ('slot', self._slot(node.name))
+        if isinstance(node, Number):
+            return ('const', node.value)
+        return ('call', fn)
+
+    def _closure(self, node: ASTNode, fns: List[Callable]) -> Callable:
+        if isinstance(node, Number):
+            value = node.value
+            return lambda s: value
+        elif isinstance(node, Var):
+            i = self._slot(node.name)
+            return lambda s: s[i]
+        elif isinstance(node, BinOp):
+            lf, rf = fns
+            if node.op == '&&':
+                return lambda s: 1 if lf(s) and rf(s) else 0
+            if node.op == '||':
+                return lambda s: 1 if lf(s) or rf(s) else 0
+            left, right = self._operand(node.left, lf), self._operand(node.right, rf)
+            if node.op in COMPARE_FUNCS:
+                return _compare(COMPARE_FUNCS[node.op], left, right)
+            return _arithmetic(ARITHMETIC_FUNCS[node.op], left, right)
+        elif isinstance(node, UnOp):
+            f, = fns
+            return lambda s: 0 if f(s) else 1
+        elif isinstance(node, Assign):
+            i = self._slot(node.name)
+            kind, value = self._operand(node.expr, fns[0])
+            if kind == 'const':
+                def assign_const(s):
+                    s[i] = value
+                return assign_const
+            f = fns[0]
+            def assign(s):
+                s[i] = f(s)
+            return assign
+        elif isinstance(node, CompoundAssign):
+            i = self._slot(node.name)
+            fn = COMPOUND_FUNCS[node.op]
+            kind, value = self._operand(node.expr, fns[0])
+            if kind == 'const':
+                def update_const(s):
+                    s[i] = fn(s[i], value)
+                return update_const
+            f = fns[0]
+            def update(s):
+                s[i] = fn(s[i], f(s))
+            return update
+        elif isinstance(node, Print):
+            f, = fns
+            write = self.output.write
+            def print_value(s):
+                write(str(f(s)))
+            return print_value
+        elif isinstance(node, While):
+            cond, body = fns[0], _block(fns[1:], node.body)
+            line = _body_line(node.body)
+            if body is None:
+                def loop(s):
+                    while cond(s):
+                        pass
+            else:
+                def loop(s):
+                    while cond(s):
+                        try:
+                            body(s)
+                        except Exception as e:
+                            raise _runtime_error(e, line)
+            return loop
+        elif isinstance(node, If):
+            split = 1 + len(node.then_block)
+            else_block = node.else_block or []
+            cond = fns[0]
+            then_fn = _block(fns[1:split], node.then_block) or (lambda s: None)
+            else_fn = _block(fns[split:], else_block)
+            then_line, else_line = _body_line(node.then_block), _body_line(else_block)
+            if else_fn is None:
+                def branch(s):
+                    if cond(s):
+                        try:
+                            then_fn(s)
+                        except Exception as e:
+                            raise _runtime_error(e, then_line)
+            else:
+                def branch(s):
+                    if cond(s):
+                        try:
+                            then_fn(s)
+                        except Exception as e:
+                            raise _runtime_error(e, then_line)
+                    else:
+                        try:
+                            else_fn(s)
+                        except Exception as e:
+                            raise _runtime_error(e, else_line)
+            return branch
+        raise RuntimeError(f'Unknown AST node: {node}')
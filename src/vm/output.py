@@ -0,0 +1,122 @@
+import abc
+import sys
+from collections import deque
+from typing import List, Optional, TextIO
+
+# Where the backends send the lines a program prints. A sink is given one
+# line at a time, without its newline, and is flushed when a run ends;
+# output_lines on a backend is whatever its sink still holds.
+
+# Default flush policy of the stream sinks: write out once this many lines,
+# or this many characters, are waiting
+DEFAULT_FLUSH_LINES = 1024
+DEFAULT_FLUSH_CHARS = 64 * 1024
+
+class OutputSink(abc.ABC):
+    """Base of the output sinks; write() is the only method a sink must
+    provide, and a sink without one cannot be created."""
+
+    @abc.abstractmethod
+    def write(self, line: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    @property
+    def lines(self) -> List[str]:
+        """The printed lines the sink keeps; none for sinks that pass them on."""
+        return []
+
+class StreamSink(OutputSink):
+    """Writes lines to a text stream, buffered.
+
+    Waiting lines are joined and written with one write() when flush_lines
+    of them or flush_chars characters have built up, and on flush(). With
+    flush_lines=1 every line is written as it is printed.
+    """
+
+    def __init__(self, stream: Optional[TextIO], flush_lines: int = DEFAULT_FLUSH_LINES,
+                 flush_chars: int = DEFAULT_FLUSH_CHARS):
+        if flush_lines < 1:
+            raise ValueError('flush_lines must be at least 1')
+        self.stream = stream
+        self.flush_lines = flush_lines
+        self.flush_chars = flush_chars
+        self._buffer = []
+        self._chars = 0
+
+    def _target(self) -> TextIO:
+        return self.stream
+
+    def write(self, line: str):
+        self._buffer.append(line)
+        self._chars += len(line) + 1
+        if len(self._buffer) >= self.flush_lines or self._chars >= self.flush_chars:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            target = self._target()
+            self._buffer.append('')
+            target.write('\n'.join(self._buffer))
+            self._buffer.clear()
+            self._chars = 0
+            target.flush()
+
+class StdoutSink(StreamSink):
+    """StreamSink on whatever sys.stdout is when the lines are written.
+
+    By default a terminal gets every line as it is printed and anything else
+    (a pipe or a file) gets them in blocks.
+    """
+
+    def __init__(self, flush_lines: Optional[int] = None, flush_chars: int = DEFAULT_FLUSH_CHARS):
+        if flush_lines is None:
+            flush_lines = 1 if _isatty(sys.stdout) else DEFAULT_FLUSH_LINES
+        super().__init__(None, flush_lines, flush_chars)
+
+    def _target(self) -> TextIO:
+        return sys.stdout
+
+class RingBufferSink(OutputSink):
+    """Keeps the last capacity lines and counts the ones pushed out."""
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self._lines = deque(maxlen=capacity)
+        self.dropped = 0
+
+    def write(self, line: str):
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+
+    @property
+    def lines(self) -> List[str]:
+        return list(self._lines)
+
+class CollectorSink(OutputSink):
+    """Keeps every line, for tests and for comparing backends."""
+
+    def __init__(self):
+        self._lines = []
+        # Bound to the list's append, saving a call per PRINT
+        self.write = self._lines.append
+
+    def write(self, line: str):
+        self._lines.append(line)
+
+    @property
+    def lines(self) -> List[str]:
+        return self._lines
+
+def _isatty(stream) -> bool:
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
@@ -0,0 +1,380 @@
+from functools import partial
+from src.parser.ast_nodes import *
+from src.compiler.linetable import LineTable
+from src.exceptions import OilRuntimeError
+from src.vm.backend import Backend
+from src.vm.output import OutputSink, StdoutSink
+from typing import Any, Dict, List, Optional, Tuple
+
+# Register backend: the AST is lowered to three-address code over a fixed
+# register file, and a small interpreter runs it. a = b + c is the single
+# instruction ('ADD', a, b, c) rather than four stack operations.
+#
+# The register file holds the variables first, in order of first
+# appearance, then the temporaries of expressions, then the constants;
+# every operand is a register. Temporaries are handed out like a stack
+# while an expression is lowered and are all free again after each
+# statement.
+#
+# Instructions are tuples, the opcode first:
+#
+#   MOVE d, a                       d = a
+#   ADD|SUB|MUL|DIV d, a, b         d = a <op> b, DIV being floor division
+#   EQ|NE|LT|LE|GT|GE d, a, b       d = 1 if a <cmp> b else 0
+#   NOT d, a                        d = 0 if a else 1
+#   JUMP t
+#   JUMP_IF_FALSE|JUMP_IF_TRUE a, t
+#   JUMP_EQ|JUMP_NE|...|JUMP_GE a, b, t     jump to t if a <cmp> b
+#   PRINT a
+#   HALT
+#
+# Jump targets are always the last field.
+#
+# As in the stack compiler, each instruction is tagged with the line of its
+# statement, and an error is raised as OilRuntimeError with the line of the
+# instruction that failed.
+
+RInstr = Tuple[Any, ...]
+
+ARITHMETIC_OPCODES = {'+': 'ADD', '-': 'SUB', '*': 'MUL', '/': 'DIV'}
+COMPARE_OPCODES = {'==': 'EQ', '!=': 'NE', '<': 'LT', '<=': 'LE', '>': 'GT', '>=': 'GE'}
+NEGATED_COMPARE = {'EQ': 'NE', 'NE': 'EQ', 'LT': 'GE', 'GE': 'LT', 'GT': 'LE', 'LE': 'GT'}
+COMPOUND_OPCODES = {'+=': 'ADD', '-=': 'SUB', '*=': 'MUL', '/=': 'DIV'}
+LOGICAL_OPS = frozenset(('&&', '||'))
+
+# Operands while lowering, resolved to register numbers once the number of
+# variables and temporaries is known
+VAR, TEMP, CONST = 'var', 'temp', 'const'
+
+class _Lowering:
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.consts: Dict[Any, int] = {}
+        self.code: List[RInstr] = []
+        # (index of the first instruction, line) at each change of statement
+        self.line_marks: List[Tuple[int, int]] = []
+        self.temps = 0
+        self.max_temps = 0
+
+    def var(self, name: str) -> Tuple[str, int]:
+        idx = self.slots.get(name)
+        if idx is None:
+            idx = self.slots[name] = len(self.slots)
+        return (VAR, idx)
+
+    def const(self, value) -> Tuple[str, int]:
+        # Keyed by type too, so that 1 and True stay apart
+        key = (type(value), value)
+        idx = self.consts.get(key)
+        if idx is None:
+            idx = self.consts[key] = len(self.consts)
+        return (CONST, idx)
+
+    def temp(self) -> Tuple[str, int]:
+        reg = (TEMP, self.temps)
+        self.temps += 1
+        self.max_temps = max(self.max_temps, self.temps)
+        return reg
+
+    def release(self, *regs):
+        # Operands are the most recently allocated temporaries, if any
+        self.temps -= sum(1 for reg in regs if reg[0] == TEMP)
+
+    def lower(self, nodes: List[ASTNode]):
+        for node in nodes:
+            self.statement(node)
+        self.code.append(('HALT',))
+        base = {VAR: 0, TEMP: len(self.slots), CONST: len(self.slots) + self.max_temps}
+        code = [tuple(base[x[0]] + x[1] if isinstance(x, tuple) else x for x in instr)
+                for instr in self.code]
+        registers = [0] * (len(self.slots) + self.max_temps)
+        registers.extend(value for _, value in self.consts)
+        return code, registers, list(self.slots), self.line_table()
+
+    def line_table(self) -> LineTable:
+        lines = []
+        line = 0
+        for start, next_line in self.line_marks:
+            lines.extend([line] * (start - len(lines)))
+            line = next_line
+        # HALT takes the line of the instruction before it
+        lines.extend([line] * (len(self.code) - 1 - len(lines)))
+        lines.append(lines[-1] if lines else 0)
+        return LineTable.from_lines(lines)
+
+    def statement(self, node: ASTNode):
+        # An explicit work stack as in Compiler.compile_node: items are AST
+        # nodes, or callables that emit code. Lowered expressions leave their
+        # operand on values.
+        code = self.code
+        values = []
+        work = [node]
+        marks = self.line_marks
+        line = 0
+
+        def emit_jump(instr, jumps):
+            jumps.append(len(code))
+            code.append(instr + (None,))
+
+        def patch_here(jumps):
+            for pos in jumps:
+                code[pos] = code[pos][:-1] + (len(code),)
+
+        def expr(node, dst):
+            # Lower node, into dst if given (only ever the root of an
+            # expression, so no operand is overwritten before it is read)
+            if isinstance(node, Number):
+                values.append(self.const(node.value))
+            elif isinstance(node, Var):
+                values.append(self.var(node.name))
+            elif isinstance(node, BinOp) and node.op in LOGICAL_OPS:
+                # As in the stack compiler: 1 - decided when the branch falls
+                # through, decided when it jumps
+                dst = dst or self.temp()
+                decided = 1 if node.op == '||' else 0
+                jumps, end = [], []
+                work.append(partial(values.append, dst))
+                work.append(partial(patch_here, end))
+                work.append(('MOVE', dst, self.const(decided)))
+                work.append(partial(patch_here, jumps))
+                work.append(partial(emit_jump, ('JUMP',), end))
+                work.append(('MOVE', dst, self.const(1 - decided)))
+                work.append(partial(branch, node, bool(decided), jumps))
+            elif isinstance(node, BinOp):
+                opcode = ARITHMETIC_OPCODES.get(node.op) or COMPARE_OPCODES[node.op]
+                work.append(partial(finish, opcode, dst, 2))
+                work.append(node.right)
+                work.append(node.left)
+            elif isinstance(node, UnOp):
+                work.append(partial(finish, 'NOT', dst, 1))
+                work.append(node.expr)
+            else:
+                raise RuntimeError(f'Unknown AST node: {node}')
+
+        def finish(opcode, dst, arity):
+            operands = values[len(values) - arity:]
+            del values[len(values) - arity:]
+            self.release(*operands)
+            dst = dst or self.temp()
+            code.append((opcode, dst, *operands))
+            values.append(dst)
+
+        def branch(node, when, jumps):
+            # Jump to the target of jumps if node's truth value is when,
+            # otherwise fall through
+            if isinstance(node, UnOp) and node.op == '!':
+                work.append(partial(branch, node.expr, not when, jumps))
+            elif isinstance(node, BinOp) and node.op in LOGICAL_OPS:
+                if (node.op == '||') == when:
+                    work.append(partial(branch, node.right, when, jumps))
+                    work.append(partial(branch, node.left, when, jumps))
+                else:
+                    skip = []
+                    work.append(partial(patch_here, skip))
+                    work.append(partial(branch, node.right, when, jumps))
+                    work.append(partial(branch, node.left, not when, skip))
+            elif isinstance(node, BinOp) and node.op in COMPARE_OPCODES:
+                cmp = COMPARE_OPCODES[node.op]
+                if not when:
+                    cmp = NEGATED_COMPARE[cmp]
+                work.append(partial(compare_jump, cmp, jumps))
+                work.append(node.right)
+                work.append(node.left)
+            else:
+                work.append(partial(test_jump, when, jumps))
+                work.append(node)
+
+        def compare_jump(cmp, jumps):
+            b = values.pop()
+            a = values.pop()
+            self.release(a, b)
+            emit_jump((f'JUMP_{cmp}', a, b), jumps)
+
+        def test_jump(when, jumps):
+            a = values.pop()
+            self.release(a)
+            emit_jump(('JUMP_IF_TRUE' if when else 'JUMP_IF_FALSE', a), jumps)
+
+        def store(dst):
+            src = values.pop()
+            self.release(src)
+            if src != dst:
+                code.append(('MOVE', dst, src))
+
+        def set_line(next_line):
+            nonlocal line
+            line = next_line
+            marks.append((len(code), next_line))
+
+        def use(opcode, *operands):
+            # Emit opcode applied to the lowered value, e.g. PRINT or x += value
+            src = values.pop()
+            self.release(src)
+            code.append((opcode, *operands, src))
+
+        while work:
+            node = work.pop()
+            if isinstance(node, tuple):
+                code.append(node)
+            elif callable(node):
+                node()
+            elif isinstance(node, (Assign, CompoundAssign, Print, While, If)) and node.line != line:
+                # Code after the statement, such as a loop's closing jump,
+                # is back on the line of the one around it
+                work.append(partial(set_line, line))
+                work.append(node)
+                set_line(node.line)
+            elif isinstance(node, Assign):
+                dst = self.var(node.name)
+                work.append(partial(store, dst))
+                work.append(partial(expr, node.expr, dst))
+            elif isinstance(node, CompoundAssign):
+                dst = self.var(node.name)
+                work.append(partial(use, COMPOUND_OPCODES[node.op], dst, dst))
+                work.append(node.expr)
+            elif isinstance(node, Print):
+                work.append(partial(use, 'PRINT'))
+                work.append(node.expr)
+            elif isinstance(node, While):
+                exits = []
+                work.append(partial(patch_here, exits))
+                work.append(('JUMP', len(code)))
+                work.extend(reversed(node.body))
+                work.append(partial(branch, node.cond, False, exits))
+            elif isinstance(node, If):
+                exits = []
+                if node.else_block is not None:
+                    end = []
+                    work.append(partial(patch_here, end))
+                    work.extend(reversed(node.else_block))
+                    work.append(partial(patch_here, exits))
+                    work.append(partial(emit_jump, ('JUMP',), end))
+                else:
+                    work.append(partial(patch_here, exits))
+                work.extend(reversed(node.then_block))
+                work.append(partial(branch, node.cond, False, exits))
+            else:
+                expr(node, None)
+
+def lower(nodes: List[ASTNode]) -> Tuple[List[RInstr], List[Any], List[str], LineTable]:
+    """Lower a program to register code.
+
+    Returns (code, registers, names, lines): registers is the initial
+    register file, constants included, names[i] is the variable in register
+    i and lines the source line of each instruction.
+    """
+    return _Lowering().lower(nodes)
+
+class RegisterVM(Backend):
+    """Interpreter for register code, with the same run()/env/output_lines
+    interface as VM."""
+
+    def __init__(self, code: List[RInstr], registers: List[Any], names: List[str],
+                 output: Optional[OutputSink] = None, lines: Optional[LineTable] = None):
+        self.code = code
+        self.lines = lines if lines is not None else LineTable()
+        # Copied, so the same code and register file can be run again
+        self.registers = list(registers)
+        self.names = names
+        self.output = output if output is not None else StdoutSink()
+
+    @classmethod
+    def from_ast(cls, nodes: List[ASTNode], output: Optional[OutputSink] = None) -> 'RegisterVM':
+        code, registers, names, lines = lower(nodes)
+        return cls(code, registers, names, output, lines)
+
+    @property
+    def slots(self) -> List[Any]:
+        # Variables live in the first registers, in the order of names
+        return self.registers
+
+    def run(self):
+        try:
+            self._execute()
+        finally:
+            self.output.flush()
+
+    def _execute(self):
+        code = self.code
+        r = self.registers
+        ip = 0
+        try:
+            while True:
+                instr = code[ip]
+                op = instr[0]
+                ip += 1
+                if op == 'ADD':
+                    _, d, a, b = instr
+                    r[d] = r[a] + r[b]
+                elif op == 'MOVE':
+                    r[instr[1]] = r[instr[2]]
+                elif op == 'JUMP':
+                    ip = instr[1]
+                elif op == 'JUMP_GE':
+                    _, a, b, t = instr
+                    if r[a] >= r[b]:
+                        ip = t
+                elif op == 'JUMP_LT':
+                    _, a, b, t = instr
+                    if r[a] < r[b]:
+                        ip = t
+                elif op == 'JUMP_LE':
+                    _, a, b, t = instr
+                    if r[a] <= r[b]:
+                        ip = t
+                elif op == 'JUMP_GT':
+                    _, a, b, t = instr
+                    if r[a] > r[b]:
+                        ip = t
+                elif op == 'JUMP_EQ':
+                    _, a, b, t = instr
+                    if r[a] == r[b]:
+                        ip = t
+                elif op == 'JUMP_NE':
+                    _, a, b, t = instr
+                    if r[a] != r[b]:
+                        ip = t
+                elif op == 'SUB':
+                    _, d, a, b = instr
+                    r[d] = r[a] - r[b]
+                elif op == 'MUL':
+                    _, d, a, b = instr
+                    r[d] = r[a] * r[b]
+                elif op == 'DIV':
+                    _, d, a, b = instr
+                    r[d] = r[a] // r[b]
+                elif op == 'JUMP_IF_FALSE':
+                    if not r[instr[1]]:
+                        ip = instr[2]
+                elif op == 'JUMP_IF_TRUE':
+                    if r[instr[1]]:
+                        ip = instr[2]
+                elif op == 'LT':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] < r[b] else 0
+                elif op == 'LE':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] <= r[b] else 0
+                elif op == 'GT':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] > r[b] else 0
+                elif op == 'GE':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] >= r[b] else 0
+                elif op == 'EQ':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] == r[b] else 0
+                elif op == 'NE':
+                    _, d, a, b = instr
+                    r[d] = 1 if r[a] != r[b] else 0
+                elif op == 'NOT':
+                    r[instr[1]] = 0 if r[instr[2]] else 1
+                elif op == 'PRINT':
+                    self.output.write(str(r[instr[1]]))
+                elif op == 'HALT':
+                    break
+                else:
+                    raise RuntimeError(f'Unknown opcode {op} at ip {ip - 1}')
+        except Exception as e:
+            # ip has already moved past the failing instruction
+            raise OilRuntimeError(str(e), self.lines.line_at(ip - 1) or None) from e
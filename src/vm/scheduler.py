@@ -0,0 +1,68 @@
+import asyncio
+from src.vm.vm import VM, SUSPENDED
+from typing import Iterable, List, Optional, Union
+
+# Runs many VMs on one asyncio event loop. Each VM gets a task that runs
+# it for slice_steps instructions and then yields to the loop; asyncio
+# resumes ready tasks in the order they yielded, so the VMs take turns
+# round robin and a long loop in one of them only ever holds up the others
+# for one slice. Everything runs on the loop's thread.
+
+DEFAULT_SLICE_STEPS = 1000
+
+class StepLimitExceeded(Exception):
+    """Raised for a VM that runs for more than its step limit."""
+
+class Scheduler:
+    """Time-slices VMs on the running event loop.
+
+    step_limit, when given, bounds the instructions any one VM may run in
+    total; a VM that goes over it is stopped with StepLimitExceeded.
+    """
+
+    def __init__(self, slice_steps: int = DEFAULT_SLICE_STEPS, step_limit: Optional[int] = None):
+        if slice_steps < 1:
+            raise ValueError('slice_steps must be at least 1')
+        self.slice_steps = slice_steps
+        self.step_limit = step_limit
+        # Slices run so far, over all VMs
+        self.slices = 0
+
+    async def run(self, vm: VM) -> VM:
+        """Run vm to the end, a slice at a time, and return it.
+
+        The output is flushed however the run ends, including when the VM
+        goes over step_limit or its task is cancelled between slices.
+        """
+        steps = 0
+        try:
+            while True:
+                budget = self.slice_steps
+                if self.step_limit is not None:
+                    if steps >= self.step_limit:
+                        raise StepLimitExceeded(f'VM ran for more than {self.step_limit} steps')
+                    budget = min(budget, self.step_limit - steps)
+                status = vm.run(budget)
+                self.slices += 1
+                if status != SUSPENDED:
+                    return vm
+                steps += budget
+                # Let every other ready VM have its slice first
+                await asyncio.sleep(0)
+        finally:
+            vm.output.flush()
+
+    def spawn(self, vm: VM) -> 'asyncio.Task[VM]':
+        """Start running vm in a task on the running loop."""
+        return asyncio.get_running_loop().create_task(self.run(vm))
+
+    async def gather(self, vms: Iterable[VM]) -> List[Union[VM, BaseException]]:
+        """Run all of vms together. Each result is the VM, or the exception
+        it stopped with; one failing VM does not stop the others."""
+        return await asyncio.gather(*(self.run(vm) for vm in vms), return_exceptions=True)
+
+def run_all(vms: Iterable[VM], slice_steps: int = DEFAULT_SLICE_STEPS,
+            step_limit: Optional[int] = None) -> List[Union[VM, BaseException]]:
+    """Run vms to the end on a new event loop, as Scheduler.gather does."""
+    scheduler = Scheduler(slice_steps, step_limit)
+    return asyncio.run(scheduler.gather(vms))
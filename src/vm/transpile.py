@@ -0,0 +1,190 @@
+import ast
+from src.parser.ast_nodes import *
+from src.exceptions import OilRuntimeError
+from types import CodeType
+from src.vm.backend import Backend
+from src.vm.output import OutputSink, StdoutSink
+from typing import Any, Dict, List, Optional, Tuple
+
+# Python backend: an OilLang program becomes one Python function whose
+# variables are fast locals named v0, v1, ... by slot, all set to 0 on
+# entry. The function is compiled to a CPython code object once and can be
+# run any number of times.
+#
+# Semantics follow VM.run: values are ints, '/' is floor division, and
+# comparisons and logical operators give 1 or 0. Where only the truth value
+# is used (conditions of if, while, && and ||) the 1/0 step is left out.
+#
+# Each Python statement gets the line number of the OilLang statement it
+# comes from, so the traceback of an error gives its source line.
+
+ARITHMETIC_OPS = {'+': ast.Add, '-': ast.Sub, '*': ast.Mult, '/': ast.FloorDiv}
+COMPARE_OPS = {'==': ast.Eq, '!=': ast.NotEq, '<': ast.Lt, '<=': ast.LtE, '>': ast.Gt, '>=': ast.GtE}
+COMPOUND_OPS = {'+=': ast.Add, '-=': ast.Sub, '*=': ast.Mult, '/=': ast.FloorDiv}
+
+FUNCTION_NAME = 'oil_main'
+FILENAME = '<oillang>'
+PRINT_ARG = 'oil_print'
+SLOTS_ARG = 'oil_slots'
+
+def _load(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Load())
+
+def _store(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Store())
+
+def _to_int(test: ast.expr, true: int = 1) -> ast.expr:
+    # 1 if test else 0, or the reverse for !
+    return ast.IfExp(test=test, body=ast.Constant(true), orelse=ast.Constant(1 - true))
+
+def _body(stmts: List[ast.stmt]) -> List[ast.stmt]:
+    return stmts or [ast.Pass()]
+
+class _Lowering:
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+
+    def var(self, name: str) -> str:
+        idx = self.slots.get(name)
+        if idx is None:
+            idx = self.slots[name] = len(self.slots)
+        return f'v{idx}'
+
+    @staticmethod
+    def children(node: ASTNode) -> List[Tuple[ASTNode, bool]]:
+        # (child, whether only its truth value is needed)
+        if isinstance(node, BinOp):
+            as_bool = node.op in ('&&', '||')
+            return [(node.left, as_bool), (node.right, as_bool)]
+        if isinstance(node, UnOp):
+            return [(node.expr, True)]
+        if isinstance(node, (Assign, CompoundAssign, Print)):
+            return [(node.expr, False)]
+        if isinstance(node, While):
+            return [(node.cond, True)] + [(s, False) for s in node.body]
+        if isinstance(node, If):
+            return ([(node.cond, True)] + [(s, False) for s in node.then_block]
+                    + [(s, False) for s in node.else_block or ()])
+        return []
+
+    def lower(self, node: ASTNode, as_bool: bool, kids: List[Any]):
+        if isinstance(node, Number):
+            return ast.Constant(node.value)
+        elif isinstance(node, Var):
+            return _load(self.var(node.name))
+        elif isinstance(node, BinOp):
+            left, right = kids
+            if node.op in ARITHMETIC_OPS:
+                return ast.BinOp(left=left, op=ARITHMETIC_OPS[node.op](), right=right)
+            if node.op in COMPARE_OPS:
+                test = ast.Compare(left=left, ops=[COMPARE_OPS[node.op]()], comparators=[right])
+            else:
+                op = ast.And() if node.op == '&&' else ast.Or()
+                test = ast.BoolOp(op=op, values=[left, right])
+            return test if as_bool else _to_int(test)
+        elif isinstance(node, UnOp):
+            expr, = kids
+            if as_bool:
+                return ast.UnaryOp(op=ast.Not(), operand=expr)
+            return _to_int(expr, true=0)
+        elif isinstance(node, Assign):
+            return ast.Assign(targets=[_store(self.var(node.name))], value=kids[0])
+        elif isinstance(node, CompoundAssign):
+            return ast.AugAssign(target=_store(self.var(node.name)),
+                                 op=COMPOUND_OPS[node.op](), value=kids[0])
+        elif isinstance(node, Print):
+            return ast.Expr(ast.Call(func=_load(PRINT_ARG), args=[kids[0]], keywords=[]))
+        elif isinstance(node, While):
+            return ast.While(test=kids[0], body=_body(kids[1:]), orelse=[])
+        elif isinstance(node, If):
+            split = 1 + len(node.then_block)
+            return ast.If(test=kids[0], body=_body(kids[1:split]), orelse=kids[split:])
+        raise RuntimeError(f'Unknown AST node: {node}')
+
+    def module(self, nodes: List[ASTNode]) -> ast.Module:
+        # Post-order with an explicit stack, as in fold_expr
+        results = []
+        stack = [(node, False, False) for node in reversed(nodes)]
+        while stack:
+            node, as_bool, children_done = stack.pop()
+            children = self.children(node)
+            if not children_done and children:
+                stack.append((node, as_bool, True))
+                stack.extend((child, b, False) for child, b in reversed(children))
+                continue
+            kids = results[len(results) - len(children):]
+            del results[len(results) - len(children):]
+            lowered = self.lower(node, as_bool, kids)
+            if isinstance(lowered, ast.stmt) and node.line:
+                lowered.lineno = lowered.end_lineno = node.line
+                lowered.col_offset = lowered.end_col_offset = 0
+            results.append(lowered)
+
+        names = [f'v{i}' for i in range(len(self.slots))]
+        init = []
+        if names:
+            init.append(ast.Assign(targets=[_store(n) for n in names], value=ast.Constant(0)))
+        # The finally clause hands the variables back even if the program
+        # stops on an error, as the VM's slots would be left
+        save = ast.Assign(
+            targets=[ast.Subscript(value=_load(SLOTS_ARG), slice=ast.Slice(), ctx=ast.Store())],
+            value=ast.List(elts=[_load(n) for n in names], ctx=ast.Load()))
+        body = init + [ast.Try(body=_body(results), handlers=[], orelse=[], finalbody=[save])]
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg=PRINT_ARG), ast.arg(arg=SLOTS_ARG)],
+                             kwonlyargs=[], kw_defaults=[], defaults=[])
+        func = ast.FunctionDef(name=FUNCTION_NAME, args=args, body=body, decorator_list=[], returns=None)
+        return ast.fix_missing_locations(ast.Module(body=[func], type_ignores=[]))
+
+def to_python_ast(nodes: List[ASTNode]) -> Tuple[ast.Module, List[str]]:
+    """Lower a program to a Python module defining oil_main(oil_print, oil_slots).
+
+    Returns the module and the variable names, names[i] being local vi.
+    """
+    lowering = _Lowering()
+    module = lowering.module(nodes)
+    return module, list(lowering.slots)
+
+class PythonProgram(Backend):
+    """A program compiled to a CPython code object, with the same
+    run()/env/output_lines interface as VM.
+
+    The code object holds no state of its own, so it can be kept and
+    reused: PythonProgram(code, names) runs it again without recompiling.
+    """
+
+    def __init__(self, code: CodeType, names: List[str], output: Optional[OutputSink] = None):
+        self.code = code
+        self.names = names
+        self.slots = [0] * len(names)
+        self.output = output if output is not None else StdoutSink()
+
+    @classmethod
+    def from_ast(cls, nodes: List[ASTNode], output: Optional[OutputSink] = None) -> 'PythonProgram':
+        try:
+            # ast.fix_missing_locations and compile() both recurse
+            module, names = to_python_ast(nodes)
+            code = compile(module, FILENAME, 'exec')
+        except RecursionError:
+            raise RuntimeError('Program nests too deeply for the Python backend; '
+                               'use the bytecode VM') from None
+        return cls(code, names, output)
+
+    def run(self):
+        namespace = {}
+        exec(self.code, namespace)
+        write = self.output.write
+        try:
+            namespace[FUNCTION_NAME](lambda val: write(str(val)), self.slots)
+        except Exception as e:
+            raise OilRuntimeError(str(e), _error_line(e.__traceback__)) from e
+        finally:
+            self.output.flush()
+
+def _error_line(tb) -> Optional[int]:
+    # Line of the innermost frame of the program's own code
+    line = None
+    while tb is not None:
+        if tb.tb_frame.f_code.co_filename == FILENAME:
+            line = tb.tb_lineno
+        tb = tb.tb_next
+    return line
@@ -1,84 +1,251 @@
-from typing import List, Tuple, Any
+import operator
+from src.compiler.codeobject import *
+from src.compiler.linetable import LineTable
+from src.exceptions import OilRuntimeError
+from src.vm.backend import Backend
+from src.vm.output import OutputSink, StdoutSink
+from typing import Callable, List, Optional, Sequence, Tuple, Any, Union
 
-class VM:
-    def __init__(self, code: List[Tuple[str, Any]]):
+# Operators used by the superinstructions, with the same semantics as the
+# matching single opcodes below
+BINARY_FUNCS = {
+    'ADD': operator.add,
+    'SUB': operator.sub,
+    'MUL': operator.mul,
+    'DIV': lambda a, b: a // b if isinstance(a, int) and isinstance(b, int) else a / b,
+    'EQ': lambda a, b: 1 if a == b else 0,
+    'NE': lambda a, b: 1 if a != b else 0,
+    'LT': lambda a, b: 1 if a < b else 0,
+    'LE': lambda a, b: 1 if a <= b else 0,
+    'GT': lambda a, b: 1 if a > b else 0,
+    'GE': lambda a, b: 1 if a >= b else 0,
+    # Division of operands proven to be ints by the specialize pass
+    'IDIV': operator.floordiv,
+}
+
+# What VM.run returns: the program has finished, or it has used up its
+# step budget and can be resumed
+HALTED = 'halted'
+SUSPENDED = 'suspended'
+
+# Superinstructions whose argument names an operator at index 2; the VM
+# looks the function up once, when it loads the code
+BINOP_ARG_OPS = frozenset((OP_LOAD_CONST_OP, OP_COMPARE_JUMP, OP_COMPARE_CONST_JUMP))
+
+class VM(Backend):
+    def __init__(self, code: Union[CodeObject, List[Tuple[str, Any]]], names: Sequence[str] = (),
+                 lines: Optional[LineTable] = None, output: Optional[OutputSink] = None):
+        # Instruction lists, as the compiler produces them, are packed first;
+        # a CodeObject brings its own names and lines
+        if not isinstance(code, CodeObject):
+            code = CodeObject.pack(code, names, lines)
         self.code = code 
+        # Unpacked for dispatch: opcode numbers, and operands with constant
+        # pool indices and operator names already looked up
+        self.ops = code.ops.tolist()
+        self.operands = operands = code.operands()
+        for i, op in enumerate(self.ops):
+            if op in BINOP_ARG_OPS:
+                arg = operands[i]
+                operands[i] = arg[:2] + (BINARY_FUNCS[arg[2]],) + arg[3:]
+        # The handlers work on these lists in place, so they are never
+        # replaced, only changed
         self.stack = [] 
-        self.env = {} 
+        # Variables live in slots assigned by the compiler; names[i] is the
+        # variable in slot i. Every slot starts at 0, which is what an unset
+        # variable reads as.
+        self.names = list(code.names)
+        self.slots = [0] * len(self.names)
         self.ip = 0 
-        self.output_lines = []
-        
-    def run(self):
-        while self.ip < len(self.code):
-            instr, arg = self.code[self.ip]
-            self.ip += 1
-            if instr == 'CONST': 
-                self.stack.append(arg)
-            elif instr == 'LOAD': 
-                self.stack.append(self.env.get(arg,0))
-            elif instr == 'STORE': 
-                self.env[arg] = self.stack.pop()
-            elif instr == 'ADD': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a+b)
-            elif instr == 'SUB': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a-b)
-            elif instr == 'MUL': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a*b)
-            elif instr == 'DIV': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(a//b if isinstance(a,int) and isinstance(b,int) else a/b)
-            elif instr == 'EQ': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a==b else 0)
-            elif instr == 'NE': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a!=b else 0)
-            elif instr == 'LT': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a<b else 0)
-            elif instr == 'LE': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a<=b else 0)
-            elif instr == 'AND':
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a and b else 0)
-            elif instr == 'OR':
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a or b else 0)
-            elif instr == 'NOT':
-                a = self.stack.pop()
-                self.stack.append(1 if not a else 0)
-            elif instr == 'GT': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a>b else 0)
-            elif instr == 'GE': 
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(1 if a>=b else 0)
-            elif instr == 'JUMP_IF_FALSE': 
-                cond = self.stack.pop()
-                self.ip = arg if not cond else self.ip
-            elif instr == 'JUMP': 
-                self.ip = arg
-            elif instr == 'PRINT': 
-                val = self.stack.pop()
-                self.output_lines.append(str(val))
-                print(val)
-            elif instr == 'HALT': 
-                break
-            else: 
-                raise RuntimeError(f'Unknown opcode {instr} at ip {self.ip-1}')
\ No newline at end of file
+        # PRINT writes here; buffered standard output unless the caller
+        # picks another sink
+        self.output = output if output is not None else StdoutSink()
+        # The handler of every instruction, looked up once in the table
+        # indexed by opcode number
+        handlers = self._handlers()
+        self.dispatch = [handlers[op] for op in self.ops]
+
+    def _handlers(self) -> List[Callable[[Any, int], int]]:
+        """Handler of each opcode, by opcode number.
+
+        A handler takes the operand of its instruction and the index of the
+        next one, and returns the index to continue at. The stack, its
+        methods and the slots are closed over, so a handler touches no
+        attributes.
+        """
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        slots = self.slots
+        write = self.output.write
+        end = len(self.ops)
+
+        def const(arg, ip):
+            push(arg)
+            return ip
+        def load_slot(arg, ip):
+            push(slots[arg])
+            return ip
+        def store_slot(arg, ip):
+            slots[arg] = pop()
+            return ip
+        def add(arg, ip):
+            b = pop()
+            stack[-1] = stack[-1] + b
+            return ip
+        def sub(arg, ip):
+            b = pop()
+            stack[-1] = stack[-1] - b
+            return ip
+        def mul(arg, ip):
+            b = pop()
+            stack[-1] = stack[-1] * b
+            return ip
+        def div(arg, ip):
+            b = pop()
+            a = stack[-1]
+            stack[-1] = a // b if isinstance(a, int) and isinstance(b, int) else a / b
+            return ip
+        def int_div(arg, ip):
+            b = pop()
+            stack[-1] = stack[-1] // b
+            return ip
+        def eq(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] == b else 0
+            return ip
+        def ne(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] != b else 0
+            return ip
+        def lt(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] < b else 0
+            return ip
+        def le(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] <= b else 0
+            return ip
+        def gt(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] > b else 0
+            return ip
+        def ge(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] >= b else 0
+            return ip
+        def and_(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] and b else 0
+            return ip
+        def or_(arg, ip):
+            b = pop()
+            stack[-1] = 1 if stack[-1] or b else 0
+            return ip
+        def not_(arg, ip):
+            stack[-1] = 0 if stack[-1] else 1
+            return ip
+        def dup(arg, ip):
+            push(stack[-1])
+            return ip
+        def print_(arg, ip):
+            write(str(pop()))
+            return ip
+        def jump(arg, ip):
+            return arg
+        def jump_if_false(arg, ip):
+            return ip if pop() else arg
+        def jump_if_true(arg, ip):
+            return arg if pop() else ip
+        def inc_var(arg, ip):
+            slot, delta = arg
+            slots[slot] += delta
+            return ip
+        def store_const(arg, ip):
+            slot, value = arg
+            slots[slot] = value
+            return ip
+        def load_const_op(arg, ip):
+            slot, value, binop = arg
+            push(binop(slots[slot], value))
+            return ip
+        def compare_jump(arg, ip):
+            a, b, cmp, target = arg
+            return ip if cmp(slots[a], slots[b]) else target
+        def compare_const_jump(arg, ip):
+            slot, value, cmp, target = arg
+            return ip if cmp(slots[slot], value) else target
+        def halt(arg, ip):
+            return end
+
+        table = [None] * len(OPCODES)
+        table[OP_CONST] = const
+        table[OP_LOAD_SLOT] = load_slot
+        table[OP_STORE_SLOT] = store_slot
+        table[OP_ADD] = add
+        table[OP_SUB] = sub
+        table[OP_MUL] = mul
+        table[OP_DIV] = div
+        table[OP_IDIV] = int_div
+        table[OP_EQ] = eq
+        table[OP_NE] = ne
+        table[OP_LT] = lt
+        table[OP_LE] = le
+        table[OP_GT] = gt
+        table[OP_GE] = ge
+        table[OP_AND] = and_
+        table[OP_OR] = or_
+        table[OP_NOT] = not_
+        table[OP_DUP] = dup
+        table[OP_PRINT] = print_
+        table[OP_JUMP] = jump
+        table[OP_JUMP_IF_FALSE] = jump_if_false
+        table[OP_JUMP_IF_TRUE] = jump_if_true
+        table[OP_INC_VAR] = inc_var
+        table[OP_STORE_CONST] = store_const
+        table[OP_LOAD_CONST_OP] = load_const_op
+        table[OP_COMPARE_JUMP] = compare_jump
+        table[OP_COMPARE_CONST_JUMP] = compare_const_jump
+        table[OP_HALT] = halt
+        return table
+
+    @property
+    def halted(self) -> bool:
+        return self.ip >= len(self.dispatch)
+
+    def run(self, max_steps: Optional[int] = None) -> str:
+        """Run to HALT or the end of the code, or for at most max_steps
+        instructions.
+
+        Returns HALTED, or SUSPENDED when max_steps ran out first. A
+        suspended VM keeps its ip, stack and variables, and the next run()
+        carries on where it stopped. The output is flushed once the program
+        halts or fails, not after every slice.
+
+        An error in an instruction is raised as OilRuntimeError with the
+        source line of the instruction, when the code has a line table.
+        """
+        dispatch, operands = self.dispatch, self.operands
+        ip = self.ip
+        end = len(dispatch)
+        try:
+            if max_steps is None:
+                while ip < end:
+                    ip = dispatch[ip](operands[ip], ip + 1)
+            else:
+                for _ in range(max_steps):
+                    if ip >= end:
+                        break
+                    ip = dispatch[ip](operands[ip], ip + 1)
+        except BaseException as e:
+            # ip is still the index of the failing instruction
+            self.ip = ip
+            self.output.flush()
+            if isinstance(e, Exception):
+                raise OilRuntimeError(str(e), self.code.line_at(ip) or None) from e
+            raise
+        self.ip = ip
+        if ip < end:
+            return SUSPENDED
+        self.output.flush()
+        return HALTED